@@ -1,13 +1,17 @@
-#!/pkg/qct/software/python/2.7.6/bin/python
+#!/usr/bin/env python3
 '''===------ CacheFileParser.py--------------------------------------------------===
    (c) 2020 Qualcomm Innovation Center, Inc. All rights reserved.
 
   ===----------------------------------------------------------------------='''
 
 import argparse
+import glob
+import json
 import os
 import sys
-from CacheFilePyReader import CacheFileReader
+
+# CacheFileReader, and with it protobuf, is imported once the arguments are
+# parsed so that --help and usage errors return without loading them.
 
 cache_file_parser = argparse.ArgumentParser(
     description='Linker Cache File Parser')
@@ -17,7 +21,9 @@ cache_file_parser.add_argument('--cache-file',
                                metavar='cache_file',
                                required=True,
                                type=str,
-                               help='Linker Cache File')
+                               nargs='+',
+                               help='Linker Cache File, several files or '
+                               'glob patterns select --batch')
 
 cache_file_parser.add_argument('--header',
                                help='Print File Header',
@@ -29,34 +35,345 @@ cache_file_parser.add_argument('--sections',
 cache_file_parser.add_argument('--common_symbols',
                                help='Print all common symbols',
                                action='store_true')
+cache_file_parser.add_argument('--lazy',
+                               help='Decode input sections and common symbols '
+                               'on access instead of loading them all',
+                               action='store_true')
+cache_file_parser.add_argument('--mmap',
+                               help='Parse the cache file from a memory '
+                               'mapping instead of reading it into memory',
+                               action='store_true')
+cache_file_parser.add_argument('--diff',
+                               metavar='old_cache_file',
+                               type=str,
+                               help='Report what changed from old_cache_file '
+                               'to the cache file')
+cache_file_parser.add_argument('--diff-summary',
+                               help='With --diff, only print the number of '
+                               'changes per category',
+                               action='store_true')
+cache_file_parser.add_argument('--stream',
+                               help='Write --sections and --common_symbols '
+                               'in batches without loading them all, implies '
+                               '--lazy',
+                               action='store_true')
+cache_file_parser.add_argument('--format',
+                               help='Output format of --stream, jsonl '
+                               'implies --stream and excludes the text '
+                               'reports',
+                               choices=['tsv', 'jsonl'],
+                               default='tsv')
+cache_file_parser.add_argument('--build-index',
+                               help='Write a lookup index next to the cache '
+                               'file',
+                               action='store_true')
+cache_file_parser.add_argument('--find-section',
+                               metavar='NAME',
+                               action='append',
+                               help='Print the input sections named NAME, '
+                               'using the lookup index')
+cache_file_parser.add_argument('--find-symbol',
+                               metavar='NAME',
+                               action='append',
+                               help='Print the common symbols named NAME, '
+                               'using the lookup index')
+cache_file_parser.add_argument('--find-file',
+                               metavar='PATH',
+                               action='append',
+                               help='Print the object files and archive '
+                               'members named PATH, using the lookup index')
+cache_file_parser.add_argument('--output-section',
+                               metavar='NAME',
+                               action='append',
+                               help='Print the input sections placed in '
+                               'output section NAME')
+cache_file_parser.add_argument('--input-file',
+                               metavar='PATH',
+                               action='append',
+                               help='Print the input sections of input file '
+                               'PATH, an object file or archive(member)')
+
+cache_file_parser.add_argument('--batch',
+                               help='Summarize every cache file in one '
+                               'report',
+                               action='store_true')
+cache_file_parser.add_argument('--jobs',
+                               metavar='N',
+                               type=int,
+                               default=0,
+                               help='Number of worker processes for --batch '
+                               'or hashing threads for --verify and --predict')
+cache_file_parser.add_argument('--archive-report',
+                               help='Print input section and common symbol '
+                               'counts per archive and per object file',
+                               action='store_true')
+cache_file_parser.add_argument('--export-sqlite',
+                               metavar='DB',
+                               help='Export the cache file into the SQLite '
+                               'database DB, replacing its tables')
+cache_file_parser.add_argument('--decoder',
+                               help='Decoder of input sections and common '
+                               'symbols, auto picks wire when protobuf has '
+                               'no C++ backend',
+                               choices=['auto', 'protobuf', 'wire'],
+                               default='auto')
+cache_file_parser.add_argument('--profile',
+                               help='Print time, bytes and records per '
+                               'phase of reading the cache file to stderr',
+                               action='store_true')
+cache_file_parser.add_argument('--profile-json',
+                               metavar='FILE',
+                               help='Write the --profile report as JSON to '
+                               'FILE, - for stdout')
+cache_file_parser.add_argument('--verify',
+                               help='Check that the inputs recorded in the '
+                               'cache file did not change on disk',
+                               action='store_true')
+cache_file_parser.add_argument('--verify-state',
+                               metavar='FILE',
+                               help='Stat cache of --verify and --predict, '
+                               'defaults to the cache file with a .verify '
+                               'suffix')
+cache_file_parser.add_argument('--predict',
+                               metavar='INPUT_LIST',
+                               help='Predict which output sections a link of '
+                               'the objects and archives listed in '
+                               'INPUT_LIST can reuse, exits 1 if a full link '
+                               'is needed')
+cache_file_parser.add_argument('--linker-script',
+                               metavar='PATH',
+                               action='append',
+                               help='With --predict, a linker script of the '
+                               'current link, defaults to the recorded ones')
+cache_file_parser.add_argument('--full-link-threshold',
+                               metavar='FRACTION',
+                               type=float,
+                               default=0.5,
+                               help='With --predict, recommend a full link if '
+                               'more than FRACTION of the sections are relaid')
+cache_file_parser.add_argument('--verbose',
+                               help='With --verify or --predict, print every '
+                               'input or output section',
+                               action='store_true')
+
+
+def is_pattern(path):
+    '''Return True if path has glob wildcards.'''
+    return any(c in path for c in '*?[')
+
+
+def run_batch(args):
+    '''Handle --batch: summarize many cache files in a process pool.'''
+    import CacheFileReader
+    cache_files = []
+    for pattern in args.cache_file:
+        if is_pattern(pattern):
+            cache_files.extend(glob.glob(pattern))
+        else:
+            cache_files.append(pattern)
+    # Sorted and de-duplicated so the report does not depend on the order
+    # of the command line or of the file system.
+    cache_files = sorted(set(cache_files))
+    if not cache_files:
+        print('No Cache files match the patterns specified')
+        sys.exit(1)
+    summaries = CacheFileReader.summarizeDictionaries(cache_files,
+                                                      args.jobs or None)
+    CacheFileReader.printBatchReport(summaries)
+
+
+def main():
+    # Execute the parse_args() method
+    args = cache_file_parser.parse_args()
+    import CacheFileReader
+    if (args.batch or len(args.cache_file) > 1 or
+            is_pattern(args.cache_file[0])):
+        run_batch(args)
+        sys.exit()
+    cache_file = args.cache_file[0]
+    if args.format == 'jsonl':
+        # Every other report prints text to the same stdout, which would
+        # no longer be valid JSONL.
+        for option, value in (('--diff', args.diff),
+                              ('--header', args.header),
+                              ('--archive-report', args.archive_report),
+                              ('--output-section', args.output_section),
+                              ('--input-file', args.input_file),
+                              ('--build-index', args.build_index),
+                              ('--find-section', args.find_section),
+                              ('--find-symbol', args.find_symbol),
+                              ('--find-file', args.find_file),
+                              ('--verify', args.verify),
+                              ('--predict', args.predict),
+                              ('--profile-json -', args.profile_json == '-')):
+            if value:
+                cache_file_parser.error('--format jsonl cannot be combined '
+                                        'with ' + option)
+        args.stream = True
+    if args.stream:
+        args.lazy = True
+
+    if not os.path.exists(cache_file):
+        print('The Cache file specified does not exist')
+        sys.exit()
+
+    if (args.build_index or args.find_section or args.find_symbol or
+            args.find_file):
+        # The index is rebuilt whenever the cache file has changed since it was
+        # written, lookups then only parse the small non-indexed fields.
+        index = CacheFileReader.DictionaryIndex(cache_file)
+        if args.build_index:
+            index.build()
+            print('Wrote ' + index.write())
+        else:
+            index.loadOrBuild()
+        reader = CacheFileReader.CachingInfoDictReader(cache_file,
+                                                       use_mmap=args.mmap)
+        reader.readRanges(index.remainder)
+        for name in args.find_section or []:
+            for x in CacheFileReader.findSections(reader, index, name):
+                x.dump()
+        for name in args.find_symbol or []:
+            for x in CacheFileReader.findSections(reader, index, name,
+                                                  symbols=True):
+                x.dump()
+        for path in args.find_file or []:
+            for x in CacheFileReader.findInputFiles(reader, index, path):
+                x.dump()
+        sys.exit()
+
+    decoder = None if args.decoder == 'auto' else args.decoder
+    profile = None
+    if args.profile or args.profile_json:
+        profile = CacheFileReader.ReadProfile()
+        profile.start()
+    cache_file = CacheFileReader.CachingInfoDictReader(cache_file,
+                                                      lazy=args.lazy,
+                                                      use_mmap=args.mmap,
+                                                      profile=profile,
+                                                      decoder=decoder)
+    cache_file.readDictionary()
+    try:
+        dump_cache_file(args, cache_file)
+    finally:
+        if profile is not None:
+            profile.stop()
+            write_profile(args, profile)
+
+
+def write_profile(args, profile):
+    '''Handle --profile and --profile-json.'''
+    if args.profile:
+        profile.dump(sys.stderr)
+    if args.profile_json == '-':
+        json.dump(profile.toDict(), sys.stdout, indent=2, sort_keys=True)
+        print('')
+    elif args.profile_json:
+        with open(args.profile_json, 'w') as f:
+            json.dump(profile.toDict(), f, indent=2, sort_keys=True)
+
+
+def dump_cache_file(args, cache_file):
+    '''Print the reports selected by args for the read cache_file.'''
+    import CacheFileReader
+    if args.diff:
+        if not os.path.exists(args.diff):
+            print('The Cache file to diff against does not exist')
+            sys.exit()
+        old_cache_file = CacheFileReader.CachingInfoDictReader(
+            args.diff, lazy=args.lazy, use_mmap=args.mmap)
+        old_cache_file.readDictionary()
+        diff = CacheFileReader.diffDictionaries(old_cache_file, cache_file)
+        if args.diff_summary:
+            diff.dumpSummary()
+        else:
+            diff.dump()
+
+    if args.header:
+        dictionary_header = cache_file.getHeader()
+        dictionary_header.printHeader()
+
+    if args.archive_report:
+        CacheFileReader.printArchiveReport(
+            *CacheFileReader.aggregateByInputFile(cache_file))
+
+    if args.export_sqlite:
+        CacheFileReader.exportSQLite(cache_file, args.export_sqlite)
+
+    if args.stream:
+        objfiles = cache_file.getInputFiles()
+        out_sections = cache_file.getOutputSections()
+        paths = [f.getDecoratedPath() for f in objfiles]
+        out_section_names = [s.getSectionName() for s in out_sections]
+        sys.stdout.flush()
+        with cache_file.phase('output'):
+            if args.sections:
+                CacheFileReader.writeRecords(
+                    sys.stdout.buffer, cache_file.iterInputSectionRecords(),
+                    paths, out_section_names, args.format)
+            if args.common_symbols:
+                CacheFileReader.writeRecords(
+                    sys.stdout.buffer, cache_file.iterCommonSymbolRecords(),
+                    paths, out_section_names, args.format,
+                    skip_unnamed=False)
+            sys.stdout.buffer.flush()
+
+    objfiles = cache_file.getInputFiles()
+    out_sections = cache_file.getOutputSections()
 
-# Execute the parse_args() method
-args = cache_file_parser.parse_args()
-cache_file = args.cache_file
+    # With --stream the reader is lazy, sections and symbols below are only
+    # decoded where --output-section or --input-file reach them.
+    sections = cache_file.getInputSections(out_sections, objfiles)
+    if args.sections and not args.stream:
+        with cache_file.phase('output'):
+            print('Input Section Name\t Output Section Name \t Input File')
+            print('-' * 80)
+            for x in sections:
+                if x.getSectionName() != "":
+                    x.dump()
 
-if not os.path.exists(cache_file):
-    print('The Cache file specified does not exist')
-    sys.exit()
+    if args.output_section or args.input_file:
+        by_output_section, by_input_file = cache_file.getSectionGroups()
+        for name in args.output_section or []:
+            print('Output Section : ' + name)
+            for out_section_id, x in enumerate(out_sections):
+                if x.getSectionName() == name:
+                    for row in by_output_section.getRows(out_section_id):
+                        if sections[row].getSectionName() != "":
+                            sections[row].dump()
+        for path in args.input_file or []:
+            print('Input File : ' + path)
+            for input_id, x in enumerate(objfiles):
+                if x.getDecoratedPath() == path:
+                    for row in by_input_file.getRows(input_id):
+                        if sections[row].getSectionName() != "":
+                            sections[row].dump()
 
-cache_file = CacheFileReader.CachingInfoDictReader(cache_file)
-cache_file.readDictionary()
+    symbols = cache_file.getCommonSymbols(out_sections, objfiles)
+    if args.common_symbols and not args.stream:
+        with cache_file.phase('output'):
+            for x in symbols:
+                x.dump()
 
-if args.header:
-    dictionary_header = cache_file.getHeader()
-    dictionary_header.printHeader()
+    if args.verify:
+        verifier = CacheFileReader.DictionaryVerifier(
+            cache_file, args.verify_state, args.jobs or None)
+        if not CacheFileReader.printVerifyReport(verifier.verify(),
+                                                 args.verbose):
+            sys.exit(1)
 
-objfiles = cache_file.getInputFiles()
-out_sections = cache_file.getOutputSections()
+    if args.predict:
+        linker_scripts = None
+        if args.linker_script:
+            linker_scripts = [os.path.abspath(path)
+                              for path in args.linker_script]
+        predictor = CacheFileReader.LinkPredictor(
+            cache_file, CacheFileReader.readInputList(args.predict),
+            linker_scripts, args.verify_state, args.jobs or None,
+            args.full_link_threshold)
+        if not predictor.predict().dump(args.verbose):
+            sys.exit(1)
 
-sections = cache_file.getInputSections(out_sections, objfiles)
-if args.sections:
-    print('Input Section Name\t Output Section Name \t Input File')
-    print('-' * 80)
-    for x in sections:
-        if x.getSectionName() != "":
-            x.dump()
 
-symbols = cache_file.getCommonSymbols(out_sections, objfiles)
-if args.common_symbols:
-    for x in symbols:
-        x.dump()
+if __name__ == '__main__':
+    main()
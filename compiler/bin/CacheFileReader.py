@@ -5,10 +5,157 @@
 
 import sys
 import os
-import cache_file_pb2
+import bisect
+import collections
+import contextlib
+import copy
+import functools
+import hashlib
+import json
+import mmap
+import struct
+import time
+import tracemalloc
+from array import array
+
+# The generated cache_file_pb2 pulls in the protobuf runtime, which dominates
+# the start-up time of short runs. It is imported by getProtobufModule when a
+# dictionary is first parsed.
+cache_file_pb2 = None
+
+# Field numbers of the repeated messages in Caching.CachingInfoDict that are
+# indexed rather than decoded up front by the lazy reader.
+INPUT_SECTIONS_FIELD = 2
+OBJECT_FILES_FIELD = 4
+ARCHIVE_MEMBERS_FIELD = 6
+COMMON_SYMBOLS_FIELD = 10
+
+WIRETYPE_VARINT = 0
+WIRETYPE_FIXED64 = 1
+WIRETYPE_LENGTH_DELIMITED = 2
+WIRETYPE_FIXED32 = 5
+
+# Field numbers of name, hash, out_section_id, input_id and rule_container_id
+# in Caching.InputSection and Caching.CommonSymbol, see decodeSectionRecord.
+INPUT_SECTION_FIELDS = (1, 2, 3, 4, 5)
+COMMON_SYMBOL_FIELDS = (1, 2, 3, 5, 4)
+
+
+def readVarint(buf, pos):
+    '''Decode the base 128 varint at buf[pos], return (value, next_pos).'''
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def skipField(buf, pos, wire_type):
+    '''Return the position just past the payload of a field at buf[pos].'''
+    if wire_type == WIRETYPE_VARINT:
+        return readVarint(buf, pos)[1]
+    if wire_type == WIRETYPE_FIXED64:
+        return pos + 8
+    if wire_type == WIRETYPE_LENGTH_DELIMITED:
+        length, pos = readVarint(buf, pos)
+        return pos + length
+    if wire_type == WIRETYPE_FIXED32:
+        return pos + 4
+    raise ValueError('Unsupported wire type {} at offset {}'.format(
+        wire_type, pos))
+
+
+def readStringField(buf, pos, end, field_number=1):
+    '''Return string field field_number of the record in buf[pos:end].'''
+    while pos < end:
+        tag, pos = readVarint(buf, pos)
+        if tag == (field_number << 3) | WIRETYPE_LENGTH_DELIMITED:
+            length, pos = readVarint(buf, pos)
+            return bytes(buf[pos:pos + length]).decode('utf-8')
+        pos = skipField(buf, pos, tag & 0x7)
+    # proto3 does not encode empty strings.
+    return ''
+
+
+def hasFastProtobuf():
+    '''Return False if protobuf runs on its pure-Python implementation.'''
+    try:
+        from google.protobuf.internal import api_implementation
+    except ImportError:
+        return True
+    return api_implementation.Type() != 'python'
+
+
+def getProtobufModule():
+    '''Return the cache_file_pb2 module, importing it on first use.'''
+    global cache_file_pb2
+    if cache_file_pb2 is None:
+        import cache_file_pb2
+    return cache_file_pb2
+
+
+def getFieldSlots(fields):
+    '''Map field numbers to their position in fields, for decoding.'''
+    slots = [None] * (max(fields) + 1)
+    for slot, field_number in enumerate(fields):
+        slots[field_number] = slot
+    return slots
+
+
+def decodeSectionRecord(buf, pos, end, slots):
+    '''Decode the InputSection or CommonSymbol record in buf[pos:end].
+
+    Returns [name, hash, out_section_id, input_id, rule_container_id],
+    slots comes from getFieldSlots(INPUT_SECTION_FIELDS) or
+    getFieldSlots(COMMON_SYMBOL_FIELDS). Single byte tags and varints,
+    by far the most common ones, are decoded inline. Raises IndexError if
+    a field runs past end or past the end of buf.
+    '''
+    values = ['', 0, 0, 0, 0]
+    nslots = len(slots)
+    while pos < end:
+        tag = buf[pos]
+        pos += 1
+        if tag & 0x80:
+            tag, pos = readVarint(buf, pos - 1)
+        field_number = tag >> 3
+        wire_type = tag & 0x7
+        slot = slots[field_number] if field_number < nslots else None
+        if wire_type == WIRETYPE_VARINT:
+            value = buf[pos]
+            pos += 1
+            if value & 0x80:
+                value, pos = readVarint(buf, pos - 1)
+            if slot is not None:
+                values[slot] = value
+        elif wire_type == WIRETYPE_LENGTH_DELIMITED:
+            length = buf[pos]
+            pos += 1
+            if length & 0x80:
+                length, pos = readVarint(buf, pos - 1)
+            if slot == 0:
+                values[0] = str(buf[pos:pos + length], 'utf-8')
+            pos += length
+        else:
+            pos = skipField(buf, pos, wire_type)
+    if pos != end:
+        raise IndexError('Record ending at offset {} is truncated'.format(
+            end))
+    return values
+
+
+def nameHash(name):
+    '''Return a 64-bit hash of name that is stable across processes.'''
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+    return struct.unpack('<Q', digest)[0]
 
 
 class Header:
+    __slots__ = ('header',)
 
     def __init__(self, header):
         self.header = header
@@ -33,6 +180,7 @@ class InputFileKind:
 
 
 class InputFile(object):
+    __slots__ = ('kind',)
 
     def __init__(self):
         self.kind = InputFileKind.Undef
@@ -54,6 +202,7 @@ class InputFile(object):
 
 
 class ObjectFile(InputFile):
+    __slots__ = ('filename', 'hash')
 
     def __init__(self, name, hash):
         super(InputFile, self).__init__()
@@ -78,6 +227,7 @@ class ObjectFile(InputFile):
 
 
 class ArchiveMember(ObjectFile):
+    __slots__ = ()
 
     def __init__(self, name, hash):
         super(ArchiveMember, self).__init__(name, hash)
@@ -85,6 +235,7 @@ class ArchiveMember(ObjectFile):
 
 
 class ArchiveFile(InputFile):
+    __slots__ = ('filename', 'hash')
 
     def __init__(self, name, hash):
         super(InputFile, self).__init__()
@@ -109,6 +260,7 @@ class ArchiveFile(InputFile):
 
 
 class ArchiveFileWithMember(InputFile):
+    __slots__ = ('archivefile', 'archivemember')
 
     def __init__(self, archivefile, archivemember):
         super(InputFile, self).__init__()
@@ -131,7 +283,25 @@ class ArchiveFileWithMember(InputFile):
         ) + '(' + self.archivemember.getFileName() + ')'
 
 
+class LinkerScriptFile(object):
+    __slots__ = ('filename', 'hash')
+
+    def __init__(self, name, hash):
+        self.filename = name
+        self.hash = hash
+
+    def getHash(self):
+        return self.hash
+
+    def getFileName(self):
+        return self.filename
+
+    def dump(self):
+        print('{} \t {}'.format(self.getFileName(), self.getHash()))
+
+
 class OutputSection(object):
+    __slots__ = ('section_name', 'hash', 'section_index')
 
     def __init__(self, section_name, hash, section_index):
         self.section_name = section_name
@@ -142,7 +312,7 @@ class OutputSection(object):
         return self.section_name
 
     def getSectionHash(self):
-        return self.section_hash
+        return self.hash
 
     def getSectionIndex(self):
         return self.section_index
@@ -152,6 +322,7 @@ class OutputSection(object):
 
 
 class RuleContainer(object):
+    __slots__ = ('rule_hash',)
 
     def __init__(self, rule_hash):
         self.rule_hash = rule_hash
@@ -161,6 +332,8 @@ class RuleContainer(object):
 
 
 class InputSection(object):
+    __slots__ = ('section_name', 'out_section_id', 'input_id',
+                 'input_files', 'out_sections')
 
     def __init__(self, section_name, out_section_id,
                  input_id, out_sections, input_files):
@@ -187,6 +360,8 @@ class InputSection(object):
 
 
 class CommonSymbol(object):
+    __slots__ = ('symbol_name', 'out_section_id', 'input_id',
+                 'input_files', 'out_sections')
 
     def __init__(self, symbol_name, out_section_id,
                  input_id, out_sections, input_files):
@@ -212,33 +387,486 @@ class CommonSymbol(object):
                                   out_section_name, input_path))
 
 
+class StringTable(object):
+    '''Interned strings, each distinct string is stored once.'''
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, string):
+        '''Return the index of string, adding it if it is not known yet.'''
+        if self.ids is None:
+            self.ids = dict((s, i) for i, s in enumerate(self.strings))
+        index = self.ids.get(string)
+        if index is None:
+            index = len(self.strings)
+            self.ids[string] = index
+            self.strings.append(string)
+        return index
+
+    def compact(self):
+        '''Drop the reverse lookup, it is rebuilt by the next intern.'''
+        self.ids = None
+
+    def __getitem__(self, index):
+        return self.strings[index]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class RecordTable(object):
+    '''Columnar store of input sections or common symbols.
+
+    Every record is a row across parallel arrays of ids and hashes, names
+    are indexes into a StringTable shared by the reader. Indexing or
+    iterating the table returns a transient view built with view_class,
+    InputSection or CommonSymbol, so only the columns stay in memory.
+    '''
+
+    def __init__(self, strings, view_class, out_sections, input_files):
+        self.strings = strings
+        self.view_class = view_class
+        self.out_sections = out_sections
+        self.input_files = input_files
+        self.names = array('I')
+        self.hashes = array('Q')
+        self.out_section_ids = array('I')
+        self.input_ids = array('I')
+        self.rule_container_ids = array('I')
+
+    def append(self, name, hash, out_section_id, input_id,
+               rule_container_id):
+        self.names.append(self.strings.intern(name))
+        self.hashes.append(hash)
+        self.out_section_ids.append(out_section_id)
+        self.input_ids.append(input_id)
+        self.rule_container_ids.append(rule_container_id)
+
+    def getName(self, i):
+        return self.strings[self.names[i]]
+
+    def bind(self, out_sections, input_files):
+        '''Return a table sharing these columns that resolves views against
+        out_sections and input_files.
+        '''
+        table = copy.copy(self)
+        table.out_sections = out_sections
+        table.input_files = input_files
+        return table
+
+    def iterRecords(self):
+        '''Yield (name, hash, out_section_id, input_id, rule_container_id).'''
+        strings = self.strings.strings
+        for name, hash, out_section_id, input_id, rule_container_id in zip(
+                self.names, self.hashes, self.out_section_ids, self.input_ids,
+                self.rule_container_ids):
+            yield (strings[name], hash, out_section_id, input_id,
+                   rule_container_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.view_class(self.strings[self.names[i]],
+                               self.out_section_ids[i], self.input_ids[i],
+                               self.out_sections, self.input_files)
+
+    def __iter__(self):
+        strings = self.strings.strings
+        view_class = self.view_class
+        out_sections = self.out_sections
+        input_files = self.input_files
+        for name, out_section_id, input_id in zip(
+                self.names, self.out_section_ids, self.input_ids):
+            yield view_class(strings[name], out_section_id, input_id,
+                             out_sections, input_files)
+
+
+class RecordIndex(object):
+    '''Offsets and lengths of the encoded records of one repeated field.'''
+
+    def __init__(self):
+        self.offsets = array('Q')
+        self.lengths = array('I')
+
+    def add(self, offset, length):
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+class GroupedIndex(object):
+    '''Record numbers grouped by a small integer key, in CSR form.
+
+    The records whose key is k are rows[starts[k]:starts[k + 1]], in
+    record order.
+    '''
+
+    def __init__(self, keys, ngroups=0):
+        if keys:
+            ngroups = max(ngroups, max(keys) + 1)
+        starts = array('I', [0]) * (ngroups + 1)
+        for key in keys:
+            starts[key + 1] += 1
+        for k in range(ngroups):
+            starts[k + 1] += starts[k]
+        rows = array('I', [0]) * len(keys)
+        fill = starts[:-1]
+        for row, key in enumerate(keys):
+            rows[fill[key]] = row
+            fill[key] += 1
+        self.starts = starts
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def getRows(self, key):
+        if key < 0 or key >= len(self):
+            return self.rows[0:0]
+        return self.rows[self.starts[key]:self.starts[key + 1]]
+
+    def getCount(self, key):
+        if key < 0 or key >= len(self):
+            return 0
+        return self.starts[key + 1] - self.starts[key]
+
+
+class LazyRecordList(object):
+    '''Read-only sequence that decodes a record only when it is accessed.
+
+    decode is called with the encoded bytes of a single record and returns
+    the object to hand out. Nothing is cached, so memory use does not grow
+    with the number of records visited.
+    '''
+
+    def __init__(self, buf, index, decode):
+        self.buf = buf
+        self.index = index
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        offset = self.index.offsets[i]
+        return self.decode(
+            bytes(self.buf[offset:offset + self.index.lengths[i]]))
+
+    def __iter__(self):
+        buf = self.buf
+        decode = self.decode
+        for offset, length in zip(self.index.offsets, self.index.lengths):
+            yield decode(bytes(buf[offset:offset + length]))
+
+
+# Repeated fields of Caching.CachingInfoDict, in field number order.
+REPEATED_FIELDS = ('input_sections', 'output_sections', 'object_files',
+                   'archive_files', 'archive_members', 'linker_script_files',
+                   'input_files', 'rule_containers', 'common_symbols')
+
+
+@contextlib.contextmanager
+def noPhase():
+    '''Stand-in for ReadProfile.phase when a reader is not profiled.'''
+    yield
+
+
+class ReadProfile(object):
+    '''Opt-in instrumentation of a CachingInfoDictReader.
+
+    Collects the wall time of each phase, the number of bytes read, the
+    record count of every repeated field and, while started, the peak
+    memory traced by tracemalloc. Allocations made inside the protobuf C++
+    extension are not visible to tracemalloc.
+    '''
+
+    def __init__(self):
+        self.phases = []
+        self.bytes_read = 0
+        self.counts = {}
+        self.peak_memory = None
+
+    def start(self):
+        tracemalloc.start()
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Time the body of a with statement as phase name.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def countRecords(self, reader):
+        caching_info_dict = reader.caching_info_dict
+        for name in REPEATED_FIELDS:
+            self.counts[name] = len(getattr(caching_info_dict, name))
+        if reader.lazy:
+            self.counts['input_sections'] = len(reader.input_section_index)
+            self.counts['common_symbols'] = len(reader.common_symbol_index)
+        elif reader.input_section_table is not None:
+            self.counts['input_sections'] = len(reader.input_section_table)
+            self.counts['common_symbols'] = len(reader.common_symbol_table)
+
+    def toDict(self):
+        return {'phases': [{'name': name, 'seconds': seconds}
+                           for name, seconds in self.phases],
+                'total_seconds': sum(seconds for _, seconds in self.phases),
+                'bytes_read': self.bytes_read,
+                'record_counts': self.counts,
+                'peak_traced_memory': self.peak_memory}
+
+    def dump(self, out=None):
+        out = out or sys.stdout
+        for name, seconds in self.phases:
+            out.write('{:<24} {:10.3f} s\n'.format(name, seconds))
+        out.write('{:<24} {:10.3f} s\n'.format(
+            'total', sum(seconds for _, seconds in self.phases)))
+        out.write('{:<24} {:10d}\n'.format('bytes read', self.bytes_read))
+        for name in REPEATED_FIELDS:
+            if name in self.counts:
+                out.write('{:<24} {:10d}\n'.format(name, self.counts[name]))
+        if self.peak_memory is not None:
+            out.write('{:<24} {:10d}\n'.format('peak traced memory',
+                                               self.peak_memory))
+
+
+def profiled(phase):
+    '''Time a CachingInfoDictReader method as phase when it is profiled.'''
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profile is None:
+                return method(self, *args, **kwargs)
+            with self.profile.phase(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
 class CachingInfoDictReader:
 
-    def __init__(self, filename):
+    def __init__(self, filename, lazy=False, use_mmap=False, profile=None,
+                 decoder=None):
         self.dictfile = filename
         self.caching_info_dict = None
+        # In lazy mode input sections and common symbols are not decoded by
+        # readDictionary, only their location in the file is recorded.
+        self.lazy = lazy
+        # With use_mmap the dictionary is parsed straight out of a read-only
+        # mapping of the file instead of a bytes copy of it.
+        self.use_mmap = use_mmap
+        self.mapping = None
+        self.data = None
+        # Section and symbol names of all RecordTables built by this reader.
+        self.strings = StringTable()
+        self.input_section_index = None
+        self.common_symbol_index = None
+        # Input sections grouped by output section and by input file, see
+        # getSectionGroups.
+        self.section_groups = None
+        # ReadProfile collecting timings and counts, if any.
+        self.profile = profile
+        # 'wire' decodes input sections and common symbols with
+        # decodeSectionRecord straight into RecordTables, 'protobuf' leaves
+        # them to protobuf. By default the wire decoder is used when only the
+        # slow pure-Python protobuf implementation is available.
+        if decoder is None:
+            decoder = 'protobuf' if hasFastProtobuf() else 'wire'
+        self.decoder = decoder
+        self.input_section_table = None
+        self.common_symbol_table = None
+
+    def phase(self, name):
+        if self.profile is None:
+            return noPhase()
+        return self.profile.phase(name)
 
     def readDictionary(self):
-        self.caching_info_dict = cache_file_pb2.CachingInfoDict()
+        self.caching_info_dict = getProtobufModule().CachingInfoDict()
         if not os.path.exists(self.dictfile):
             print(self.dictfile + " does not exist")
             return
         # Read the dictionary.
         try:
             f = open(self.dictfile, "rb")
-            self.caching_info_dict.ParseFromString(f.read())
+            with self.phase('read'):
+                if self.use_mmap:
+                    data = self.mapDictionary(f)
+                else:
+                    data = f.read()
+            if self.lazy:
+                with self.phase('index'):
+                    self.indexDictionary(data)
+            elif self.decoder == 'wire':
+                with self.phase('decode'):
+                    self.decodeDictionary(data)
+            else:
+                with self.phase('decode'):
+                    self.caching_info_dict.ParseFromString(data)
             f.close()
         except IOError:
             print(self.dictfile + "Could not read dictionary")
+            return
+        if self.profile is not None:
+            self.profile.bytes_read += len(data)
+            self.profile.countRecords(self)
+
+    def mapDictionary(self, f):
+        '''Map the open dictionary file f and return a memoryview of it.'''
+        self.close()
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped, an empty dictionary is valid.
+            return b''
+        self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.mapping)
+
+    def close(self):
+        '''Release the file mapping, if any. Lazy records become unreadable.'''
+        if self.mapping is None:
+            return
+        if isinstance(self.data, memoryview):
+            self.data.release()
+        self.data = None
+        self.mapping.close()
+        self.mapping = None
+
+    def readRanges(self, ranges):
+        '''Parse only the given (start, end) byte ranges of the dictionary.
+
+        Used with a DictionaryIndex, whose remainder ranges hold every top
+        level field except input_sections and common_symbols.
+        '''
+        self.caching_info_dict = getProtobufModule().CachingInfoDict()
+        f = open(self.dictfile, "rb")
+        if self.use_mmap:
+            data = self.mapDictionary(f)
+            self.caching_info_dict.ParseFromString(
+                b''.join(data[start:end] for start, end in ranges))
+        else:
+            data = f.read()
+            self.caching_info_dict.ParseFromString(
+                b''.join(data[start:end] for start, end in ranges))
+        f.close()
+        self.data = data
+
+    def indexDictionary(self, data):
+        '''Index input_sections and common_symbols, parse everything else.
+
+        Only the top level of the CachingInfoDict wire format is walked. The
+        remaining fields (header, files, output sections, rule containers)
+        are small and are handed to protobuf as usual.
+        '''
+        self.data = data
+        self.input_section_index = RecordIndex()
+        self.common_symbol_index = RecordIndex()
+        rest = []
+        pos = 0
+        end = len(data)
+        try:
+            while pos < end:
+                start = pos
+                tag, pos = readVarint(data, pos)
+                field_number = tag >> 3
+                wire_type = tag & 0x7
+                if wire_type == WIRETYPE_LENGTH_DELIMITED and field_number in (
+                        INPUT_SECTIONS_FIELD, COMMON_SYMBOLS_FIELD):
+                    length, pos = readVarint(data, pos)
+                    if pos + length > end:
+                        break
+                    if field_number == INPUT_SECTIONS_FIELD:
+                        self.input_section_index.add(pos, length)
+                    else:
+                        self.common_symbol_index.add(pos, length)
+                    pos += length
+                else:
+                    pos = skipField(data, pos, wire_type)
+                    rest.append(data[start:pos])
+        except IndexError:
+            # A varint runs past the end of data.
+            pos = -1
+        if pos != end:
+            raise ValueError(self.dictfile + " is truncated")
+        self.caching_info_dict.ParseFromString(b''.join(rest))
+
+    def decodeDictionary(self, data):
+        '''Decode data into RecordTables without protobuf messages.
+
+        Like indexDictionary this walks the top level of the wire format
+        once, but input_sections and common_symbols are decoded on the spot
+        into self.input_section_table and self.common_symbol_table. Only the
+        remaining small fields are handed to protobuf.
+        '''
+        sections = RecordTable(self.strings, InputSection, None, None)
+        symbols = RecordTable(self.strings, CommonSymbol, None, None)
+        section_slots = getFieldSlots(INPUT_SECTION_FIELDS)
+        symbol_slots = getFieldSlots(COMMON_SYMBOL_FIELDS)
+        add_section = sections.append
+        add_symbol = symbols.append
+        rest = []
+        pos = 0
+        end = len(data)
+        try:
+            while pos < end:
+                start = pos
+                tag, pos = readVarint(data, pos)
+                if tag == (INPUT_SECTIONS_FIELD << 3) | \
+                        WIRETYPE_LENGTH_DELIMITED:
+                    length, pos = readVarint(data, pos)
+                    if pos + length > end:
+                        break
+                    add_section(*decodeSectionRecord(data, pos, pos + length,
+                                                     section_slots))
+                    pos += length
+                elif tag == (COMMON_SYMBOLS_FIELD << 3) | \
+                        WIRETYPE_LENGTH_DELIMITED:
+                    length, pos = readVarint(data, pos)
+                    if pos + length > end:
+                        break
+                    add_symbol(*decodeSectionRecord(data, pos, pos + length,
+                                                    symbol_slots))
+                    pos += length
+                else:
+                    pos = skipField(data, pos, tag & 0x7)
+                    rest.append(data[start:pos])
+        except IndexError:
+            # A varint or a record field runs past the end of its record.
+            pos = -1
+        if pos != end:
+            raise ValueError(self.dictfile + " is truncated")
+        self.strings.compact()
+        self.caching_info_dict.ParseFromString(b''.join(rest))
+        self.input_section_table = sections
+        self.common_symbol_table = symbols
 
     def getHeader(self):
         return Header(self.caching_info_dict.dictionary_header)
 
+    @profiled('input_files')
     def getInputFiles(self):
         files = []
         if self.caching_info_dict is None:
             return
         caching_info_dict = self.caching_info_dict
+        # All members of an archive share one ArchiveFile.
+        archives = {}
         for inputobj in self.caching_info_dict.input_files:
             if inputobj.archive_file_id == 0:
                 obj = caching_info_dict.object_files[inputobj.object_file_id]
@@ -249,13 +877,17 @@ class CachingInfoDictReader:
                     inputobj.object_file_id]
                 archivemember = ArchiveMember(
                     obj.member_name, obj.member_hash)
-                obj = caching_info_dict.archive_files[inputobj.archive_file_id]
-                archivefile = ArchiveFile(obj.file_name,
-                                          obj.file_hash)
+                archivefile = archives.get(inputobj.archive_file_id)
+                if archivefile is None:
+                    obj = caching_info_dict.archive_files[
+                        inputobj.archive_file_id]
+                    archivefile = ArchiveFile(obj.file_name, obj.file_hash)
+                    archives[inputobj.archive_file_id] = archivefile
                 files.append(ArchiveFileWithMember(archivefile,
                                                    archivemember))
         return files
 
+    @profiled('output_sections')
     def getOutputSections(self):
         out_sections = []
         if self.caching_info_dict is None:
@@ -269,27 +901,1281 @@ class CachingInfoDictReader:
                     section_entry.section_index))
         return out_sections
 
-    def getInputSections(self, outsections, inputfiles):
-        inp_sections = []
+    def getLinkerScriptFiles(self):
+        if self.caching_info_dict is None:
+            return
+        return [LinkerScriptFile(entry.file_name, entry.file_hash)
+                for entry in self.caching_info_dict.linker_script_files]
+
+    def getRuleContainers(self):
         if self.caching_info_dict is None:
             return
+        return [RuleContainer(entry.rule_hash)
+                for entry in self.caching_info_dict.rule_containers]
+
+    def iterInputSectionRecords(self):
+        '''Yield (name, hash, out_section_id, input_id, rule_container_id)
+        for every input section, in lazy or eager mode alike.
+        '''
+        if self.input_section_table is not None:
+            for record in self.input_section_table.iterRecords():
+                yield record
+            return
+        if self.lazy and self.decoder == 'wire':
+            for record in self.iterDecodedRecords(
+                    self.input_section_index, INPUT_SECTION_FIELDS):
+                yield record
+            return
+        if self.lazy:
+            section_entry = getProtobufModule().InputSection()
+            entries = self.iterIndexedRecords(self.input_section_index,
+                                              section_entry)
+        else:
+            entries = self.caching_info_dict.input_sections
+        for section_entry in entries:
+            yield (section_entry.section_name, section_entry.hash,
+                   section_entry.out_section_id, section_entry.input_id,
+                   section_entry.rule_container_id)
+
+    def iterCommonSymbolRecords(self):
+        '''Yield (name, hash, out_section_id, input_id, rule_container_id)
+        for every common symbol, in lazy or eager mode alike.
+        '''
+        if self.common_symbol_table is not None:
+            for record in self.common_symbol_table.iterRecords():
+                yield record
+            return
+        if self.lazy and self.decoder == 'wire':
+            for record in self.iterDecodedRecords(
+                    self.common_symbol_index, COMMON_SYMBOL_FIELDS):
+                yield record
+            return
+        if self.lazy:
+            symbol_entry = getProtobufModule().CommonSymbol()
+            entries = self.iterIndexedRecords(self.common_symbol_index,
+                                              symbol_entry)
+        else:
+            entries = self.caching_info_dict.common_symbols
+        for symbol_entry in entries:
+            yield (symbol_entry.symbol_name, symbol_entry.symbol_hash,
+                   symbol_entry.out_section_id, symbol_entry.input_id,
+                   symbol_entry.rule_container_id)
+
+    def iterIndexedRecords(self, index, message):
+        '''Parse each record of index into message in turn and yield it.'''
+        data = self.data
+        for offset, length in zip(index.offsets, index.lengths):
+            message.ParseFromString(bytes(data[offset:offset + length]))
+            yield message
+
+    def iterDecodedRecords(self, index, fields):
+        '''Yield each record of index decoded by decodeSectionRecord.'''
+        data = self.data
+        slots = getFieldSlots(fields)
+        try:
+            for offset, length in zip(index.offsets, index.lengths):
+                yield tuple(decodeSectionRecord(data, offset, offset + length,
+                                                slots))
+        except IndexError:
+            raise ValueError(self.dictfile + " is truncated")
+
+    def getRecordDecoder(self, fields, message_class, view_class, outsections,
+                         inputfiles):
+        '''Return a function building a view_class from one encoded record.'''
+        if self.decoder == 'wire':
+            slots = getFieldSlots(fields)
+            dictfile = self.dictfile
+            def decode(record):
+                try:
+                    name, _, out_section_id, input_id, _ = \
+                        decodeSectionRecord(record, 0, len(record), slots)
+                except IndexError:
+                    raise ValueError(dictfile + " is truncated")
+                return view_class(name, out_section_id, input_id,
+                                  outsections, inputfiles)
+            return decode
+        def decode(record):
+            entry = message_class()
+            entry.ParseFromString(record)
+            name = (entry.section_name if view_class is InputSection
+                    else entry.symbol_name)
+            return view_class(name, entry.out_section_id, entry.input_id,
+                              outsections, inputfiles)
+        return decode
+
+    def getInputIds(self, symbols=False):
+        '''Return the input_id column of the input sections or, with symbols,
+        of the common symbols as an array('I').
+        '''
+        table = (self.common_symbol_table if symbols
+                 else self.input_section_table)
+        if table is not None:
+            return table.input_ids
+        records = (self.iterCommonSymbolRecords() if symbols
+                   else self.iterInputSectionRecords())
+        return array('I', (record[3] for record in records))
+
+    @profiled('section_groups')
+    def getSectionGroups(self):
+        '''Return (by_output_section, by_input_file) GroupedIndexes.
+
+        They map an output section id or an input file id to the numbers
+        of its input sections, i.e. positions in getInputSections. Both are
+        built in a single pass over the input sections on first use.
+        '''
+        if self.section_groups is not None:
+            return self.section_groups
+        out_section_ids = array('I')
+        input_ids = array('I')
+        for _, _, out_section_id, input_id, _ in \
+                self.iterInputSectionRecords():
+            out_section_ids.append(out_section_id)
+            input_ids.append(input_id)
         caching_info_dict = self.caching_info_dict
-        for section_entry in caching_info_dict.input_sections:
-            inp_sections.append(
-                InputSection(
-                    section_entry.section_name, section_entry.out_section_id,
-                    section_entry.input_id, outsections, inputfiles))
+        self.section_groups = (
+            GroupedIndex(out_section_ids,
+                         len(caching_info_dict.output_sections)),
+            GroupedIndex(input_ids, len(caching_info_dict.input_files)))
+        return self.section_groups
+
+    @profiled('input_sections')
+    def getInputSections(self, outsections, inputfiles):
+        if self.caching_info_dict is None:
+            return
+        if self.lazy:
+            decode = self.getRecordDecoder(
+                INPUT_SECTION_FIELDS, getProtobufModule().InputSection,
+                InputSection, outsections, inputfiles)
+            return LazyRecordList(self.data, self.input_section_index, decode)
+        if self.input_section_table is not None:
+            return self.input_section_table.bind(outsections, inputfiles)
+        inp_sections = RecordTable(self.strings, InputSection,
+                                   outsections, inputfiles)
+        for record in self.iterInputSectionRecords():
+            inp_sections.append(*record)
+        self.strings.compact()
         return inp_sections
 
+    @profiled('common_symbols')
     def getCommonSymbols(self, outsections, inputfiles):
-        symbols = []
         if self.caching_info_dict is None:
             return
-        caching_info_dict = self.caching_info_dict
-        for symbol_entry in caching_info_dict.common_symbols:
-            symbols.append(
-                CommonSymbol(
-                    symbol_entry.symbol_name, symbol_entry.out_section_id,
-                                  symbol_entry.input_id,
-                                 outsections, inputfiles))
+        if self.lazy:
+            decode = self.getRecordDecoder(
+                COMMON_SYMBOL_FIELDS, getProtobufModule().CommonSymbol,
+                CommonSymbol, outsections, inputfiles)
+            return LazyRecordList(self.data, self.common_symbol_index, decode)
+        if self.common_symbol_table is not None:
+            return self.common_symbol_table.bind(outsections, inputfiles)
+        symbols = RecordTable(self.strings, CommonSymbol,
+                              outsections, inputfiles)
+        for record in self.iterCommonSymbolRecords():
+            symbols.append(*record)
+        self.strings.compact()
         return symbols
+
+
+class DictionaryIndex(object):
+    '''Sidecar lookup index of a linker cache dictionary.
+
+    For object_files, archive_members, input_sections and common_symbols the
+    sidecar holds the nameHash of every record together with its offset,
+    length and position in the dictionary, sorted by hash so that a name is
+    found by binary search. It also records the byte ranges of all top
+    level fields but input_sections and common_symbols, which lets a lookup
+    parse only those. The sidecar is
+    stamped with the size, mtime and inode of the dictionary and is ignored
+    once any of them changes.
+    '''
+
+    MAGIC = b'LCDICTIX'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIIQQQ')
+    TABLES = (('object_files', OBJECT_FILES_FIELD),
+              ('archive_members', ARCHIVE_MEMBERS_FIELD),
+              ('input_sections', INPUT_SECTIONS_FIELD),
+              ('common_symbols', COMMON_SYMBOLS_FIELD))
+
+    def __init__(self, dictfile):
+        self.dictfile = dictfile
+        self.remainder = []
+        self.tables = {}
+        self.mapping = None
+
+    @staticmethod
+    def getPath(dictfile):
+        return dictfile + '.idx'
+
+    def getStamp(self):
+        st = os.stat(self.dictfile)
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def build(self):
+        '''Scan the dictionary once and build all tables in memory.'''
+        stamp = self.getStamp()
+        fields = dict((field, name) for name, field in self.TABLES)
+        columns = dict((name, (array('Q'), array('Q'), array('I')))
+                       for name, _ in self.TABLES)
+        self.remainder = []
+        with open(self.dictfile, 'rb') as f:
+            data = f.read()
+        pos = 0
+        end = len(data)
+        while pos < end:
+            start = pos
+            tag, pos = readVarint(data, pos)
+            name = fields.get(tag >> 3)
+            if name is not None and tag & 0x7 == WIRETYPE_LENGTH_DELIMITED:
+                length, pos = readVarint(data, pos)
+                hashes, offsets, lengths = columns[name]
+                hashes.append(nameHash(readStringField(data, pos,
+                                                       pos + length)))
+                offsets.append(pos)
+                lengths.append(length)
+                pos += length
+                if name in ('input_sections', 'common_symbols'):
+                    continue
+            else:
+                pos = skipField(data, pos, tag & 0x7)
+            if self.remainder and self.remainder[-1][1] == start:
+                self.remainder[-1] = (self.remainder[-1][0], pos)
+            else:
+                self.remainder.append((start, pos))
+        self.tables = {}
+        for name, (hashes, offsets, lengths) in columns.items():
+            order = sorted(range(len(hashes)), key=hashes.__getitem__)
+            self.tables[name] = (array('Q', (hashes[i] for i in order)),
+                                 array('Q', (offsets[i] for i in order)),
+                                 array('I', (lengths[i] for i in order)),
+                                 array('I', order))
+        self.stamp = stamp
+
+    def write(self):
+        path = self.getPath(self.dictfile)
+        size, mtime, ino = self.stamp
+        with open(path + '.tmp', 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION,
+                                     sys.byteorder == 'little',
+                                     size, mtime, ino))
+            f.write(struct.pack('<Q', len(self.remainder)))
+            f.write(array('Q', [p for r in self.remainder for p in r])
+                    .tobytes())
+            for name, _ in self.TABLES:
+                hashes, offsets, lengths, order = self.tables[name]
+                f.write(struct.pack('<Q', len(hashes)))
+                for column in (hashes, offsets, lengths, order):
+                    f.write(column.tobytes())
+                    f.write(b'\0' * (-len(column) * column.itemsize % 8))
+        os.rename(path + '.tmp', path)
+        return path
+
+    def load(self):
+        '''Map an up to date sidecar, return False if there is none or it
+        is stale, empty or truncated.
+        '''
+        path = self.getPath(self.dictfile)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # An empty file cannot be mapped.
+            return False
+        layout = self.getLayout(mapping)
+        if layout is None:
+            mapping.close()
+            return False
+        stamp, remainder, tables = layout
+        view = memoryview(mapping)
+        pos, count = remainder
+        bounds = view[pos:pos + 16 * count].cast('Q')
+        self.remainder = [(bounds[2 * i], bounds[2 * i + 1])
+                          for i in range(count)]
+        self.tables = {}
+        for name, columns in tables:
+            self.tables[name] = tuple(
+                view[pos:pos + count * struct.calcsize(code)].cast(code)
+                for pos, count, code in columns)
+        self.stamp = stamp
+        self.mapping = mapping
+        return True
+
+    def getLayout(self, mapping):
+        '''Return (stamp, (position, count) of the remainder, [(table,
+        [(position, count, type code)])]) of the sidecar in mapping, None if
+        it is stale or shorter than its counts require.
+        '''
+        try:
+            magic, version, little, size, mtime, ino = \
+                self.HEADER.unpack_from(mapping)
+            if (magic != self.MAGIC or version != self.VERSION or
+                    bool(little) != (sys.byteorder == 'little') or
+                    (size, mtime, ino) != self.getStamp()):
+                return None
+            pos = self.HEADER.size
+            count = struct.unpack_from('<Q', mapping, pos)[0]
+            pos += 8
+            remainder = (pos, count)
+            pos += 16 * count
+            tables = []
+            for name, _ in self.TABLES:
+                count = struct.unpack_from('<Q', mapping, pos)[0]
+                pos += 8
+                columns = []
+                for code in ('Q', 'Q', 'I', 'I'):
+                    nbytes = count * struct.calcsize(code)
+                    columns.append((pos, count, code))
+                    pos += nbytes + (-nbytes % 8)
+                tables.append((name, columns))
+        except struct.error:
+            return None
+        if pos > len(mapping):
+            return None
+        return (size, mtime, ino), remainder, tables
+
+    def loadOrBuild(self):
+        '''Load the sidecar, rebuilding and rewriting it when it is stale or
+        cannot be loaded.
+        '''
+        if not self.load():
+            self.build()
+            self.write()
+
+    def find(self, table, name):
+        '''Yield (position, offset, length) of the records named name.
+
+        Hash collisions are possible, callers compare the decoded name.
+        '''
+        hashes, offsets, lengths, order = self.tables[table]
+        key = nameHash(name)
+        i = bisect.bisect_left(hashes, key)
+        while i < len(hashes) and hashes[i] == key:
+            yield order[i], offsets[i], lengths[i]
+            i += 1
+
+
+def findSections(reader, index, name, symbols=False):
+    '''Return InputSection (or CommonSymbol) views for records named name.
+
+    reader must have been read with readRanges(index.remainder).
+    '''
+    if symbols:
+        table, message, view_class = ('common_symbols',
+                                      getProtobufModule().CommonSymbol(),
+                                      CommonSymbol)
+    else:
+        table, message, view_class = ('input_sections',
+                                      getProtobufModule().InputSection(),
+                                      InputSection)
+    out_sections = reader.getOutputSections()
+    input_files = reader.getInputFiles()
+    found = []
+    for _, offset, length in index.find(table, name):
+        message.ParseFromString(bytes(reader.data[offset:offset + length]))
+        record_name = (message.symbol_name if symbols
+                       else message.section_name)
+        if record_name == name:
+            found.append(view_class(record_name, message.out_section_id,
+                                    message.input_id, out_sections,
+                                    input_files))
+    return found
+
+
+def findInputFiles(reader, index, path):
+    '''Return ObjectFile and ArchiveFileWithMember inputs named path.
+
+    path is matched against object file names and archive member names.
+    The inputs are those of reader.getInputFiles(), archive members share
+    their ArchiveFile as there. reader must have been read with
+    readRanges(index.remainder).
+    '''
+    caching_info_dict = reader.caching_info_dict
+    objects = set(position for position, _, _ in
+                  index.find('object_files', path)
+                  if caching_info_dict.object_files[position].file_name
+                  == path)
+    members = set(position for position, _, _ in
+                  index.find('archive_members', path)
+                  if caching_info_dict.archive_members[position].member_name
+                  == path)
+    if not objects and not members:
+        return []
+    input_files = reader.getInputFiles()
+    found_objects = collections.OrderedDict()
+    found_members = []
+    for input_id, inputobj in enumerate(caching_info_dict.input_files):
+        if inputobj.archive_file_id == 0:
+            if inputobj.object_file_id in objects:
+                found_objects.setdefault(inputobj.object_file_id,
+                                         input_files[input_id])
+        elif inputobj.object_file_id in members:
+            found_members.append(input_files[input_id])
+    return [found_objects[position] for position in sorted(found_objects)] + \
+        found_members
+
+
+def writeRecords(out, records, paths, out_section_names, format='tsv',
+                 batch_size=8192, skip_unnamed=True):
+    '''Write input section or common symbol records to the binary stream out.
+
+    records yields (name, hash, out_section_id, input_id, rule_container_id)
+    tuples, as the reader's iter*Records methods do. Each record becomes
+    one line holding its name, output section name and decorated input
+    path, either tab-separated (tsv) or as a JSON object (jsonl). Lines are
+    encoded and written batch_size at a time. With skip_unnamed, records
+    without a name are skipped, as --sections does for input sections.
+    Returns the number of records written.
+    '''
+    if format == 'jsonl':
+        encoder = json.JSONEncoder(ensure_ascii=False)
+        def formatRecord(name, out_section_name, input_path):
+            return encoder.encode({'name': name,
+                                   'output_section': out_section_name,
+                                   'input': input_path})
+    else:
+        def formatRecord(name, out_section_name, input_path):
+            return name + '\t' + out_section_name + '\t' + input_path
+    count = 0
+    batch = []
+    for name, _, out_section_id, input_id, _ in records:
+        if skip_unnamed and name == '':
+            continue
+        batch.append(formatRecord(name, out_section_names[out_section_id],
+                                  paths[input_id]))
+        if len(batch) == batch_size:
+            batch.append('')
+            out.write('\n'.join(batch).encode('utf-8'))
+            count += batch_size
+            batch = []
+    if batch:
+        count += len(batch)
+        batch.append('')
+        out.write('\n'.join(batch).encode('utf-8'))
+    return count
+
+
+# Fields of the summary produced by summarizeDictionary, in report order.
+SUMMARY_COUNTS = ('object_files', 'archive_files', 'archive_members',
+                  'input_files', 'linker_script_files', 'output_sections',
+                  'rule_containers', 'input_sections', 'common_symbols')
+
+
+def summarizeDictionary(dictfile):
+    '''Return a summary dict of dictfile for batch reports.
+
+    Input sections and common symbols are only counted, never decoded. The
+    summary holds the path, the tools version, the linker script hash, one
+    count per SUMMARY_COUNTS entry, or an error message if the file cannot
+    be read.
+    '''
+    summary = {'cache_file': dictfile}
+    if not os.path.exists(dictfile):
+        summary['error'] = 'does not exist'
+        return summary
+    reader = CachingInfoDictReader(dictfile, lazy=True, use_mmap=True)
+    try:
+        reader.readDictionary()
+    except Exception as e:
+        summary['error'] = str(e) or type(e).__name__
+        return summary
+    header = reader.getHeader()
+    summary['tools_version'] = header.getToolsVersion()
+    summary['linker_script_hash'] = header.linker_script_hash()
+    caching_info_dict = reader.caching_info_dict
+    for name in SUMMARY_COUNTS:
+        if name == 'input_sections':
+            summary[name] = len(reader.input_section_index)
+        elif name == 'common_symbols':
+            summary[name] = len(reader.common_symbol_index)
+        else:
+            summary[name] = len(getattr(caching_info_dict, name))
+    reader.close()
+    return summary
+
+
+def summarizeDictionaries(dictfiles, jobs=None):
+    '''Summarize dictfiles in a pool of jobs processes.
+
+    Summaries are returned in the order of dictfiles whatever order the
+    workers finish in. jobs defaults to the number of CPUs.
+    '''
+    if jobs == 1 or len(dictfiles) == 1:
+        return [summarizeDictionary(dictfile) for dictfile in dictfiles]
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(summarizeDictionary, dictfiles,
+                        chunksize=max(1, len(dictfiles) // (4 * (
+                            jobs or multiprocessing.cpu_count()))))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def printBatchReport(summaries):
+    '''Print one line per summary followed by aggregate totals.'''
+    columns = ('cache_file', 'tools_version', 'linker_script_hash') + \
+        SUMMARY_COUNTS
+    print('\t'.join(columns))
+    print('-' * 80)
+    totals = dict((name, 0) for name in SUMMARY_COUNTS)
+    versions = {}
+    errors = 0
+    for summary in summaries:
+        if 'error' in summary:
+            errors += 1
+            print('{}\terror: {}'.format(summary['cache_file'],
+                                         summary['error']))
+            continue
+        print('\t'.join(str(summary[name]) for name in columns))
+        for name in SUMMARY_COUNTS:
+            totals[name] += summary[name]
+        versions[summary['tools_version']] = versions.get(
+            summary['tools_version'], 0) + 1
+    print('-' * 80)
+    print('Cache Files : {} ({} unreadable)'.format(len(summaries), errors))
+    for name in SUMMARY_COUNTS:
+        print('Total {} : {}'.format(name, totals[name]))
+    for version, count in sorted(versions.items()):
+        print('Tools Version {} : {} cache files'.format(version, count))
+
+
+class DictionaryDiff(object):
+    '''Differences between an old and a new linker cache dictionary.
+
+    Each change is a (category, status, key, old, new) tuple where status is
+    one of 'added', 'removed' or 'changed' and old/new are the hashes (or
+    placements) recorded for key in the two dictionaries.
+    '''
+
+    def __init__(self):
+        self.changes = []
+
+    def compare(self, category, old, new):
+        '''Join the key -> value mappings old and new on their keys.'''
+        changes = []
+        for key, old_value in old.items():
+            new_value = new.get(key, old_value)
+            if key not in new:
+                changes.append((category, 'removed', key, old_value, None))
+            elif new_value != old_value:
+                changes.append((category, 'changed', key, old_value,
+                                new_value))
+        for key, new_value in new.items():
+            if key not in old:
+                changes.append((category, 'added', key, None, new_value))
+        changes.sort(key=lambda change: change[2])
+        self.changes.extend(changes)
+
+    def getChanges(self, category=None):
+        if category is None:
+            return self.changes
+        return [change for change in self.changes if change[0] == category]
+
+    def hasChanges(self):
+        return len(self.changes) != 0
+
+    def dump(self):
+        print('Category\tStatus\tName\tOld\tNew')
+        print('-' * 80)
+        for category, status, key, old, new in self.changes:
+            print('{}\t{}\t{}\t{}\t{}'.format(
+                category, status, self.format(key), self.format(old),
+                self.format(new)))
+
+    def format(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, tuple):
+            return ' '.join(str(v) for v in value)
+        return str(value)
+
+    def dumpSummary(self):
+        counts = {}
+        for change in self.changes:
+            counts[change[:2]] = counts.get(change[:2], 0) + 1
+        for (category, status), count in sorted(counts.items()):
+            print('{} {} : {}'.format(category, status, count))
+
+
+def getInputFileHashes(reader):
+    '''Return object file and archive member hashes keyed by path.'''
+    objects = {}
+    members = {}
+    archives = {}
+    for inputfile in reader.getInputFiles():
+        if inputfile.getKind() == InputFileKind.ArchiveFileWithMember:
+            members[inputfile.getDecoratedPath()] = \
+                inputfile.archivemember.getHash()
+            archives[inputfile.archivefile.getFileName()] = \
+                inputfile.archivefile.getHash()
+        elif inputfile.getFileName():
+            # Entries without a name are placeholders, not real inputs.
+            objects[inputfile.getFileName()] = inputfile.getHash()
+    return objects, members, archives
+
+
+def getSectionPlacements(records, paths, out_section_names):
+    '''Return {(input path, name): (hash, output section name)}.
+
+    Repeated names within one input (e.g. several .text sections in one
+    object) get a '#n' suffix from the second occurrence on, so that they
+    still join 1:1.
+    '''
+    placements = {}
+    seen = {}
+    for name, hash, out_section_id, input_id, _ in records:
+        path = paths[input_id]
+        n = seen.get((path, name), 0)
+        seen[(path, name)] = n + 1
+        if n:
+            name = '{}#{}'.format(name, n)
+        placements[(path, name)] = (hash, out_section_names[out_section_id])
+    return placements
+
+
+def diffDictionaries(old_reader, new_reader):
+    '''Compare two read dictionaries and return a DictionaryDiff.
+
+    Every category is joined on a name key through dictionaries, so the
+    cost is linear in the number of records of both dictionaries.
+    '''
+    diff = DictionaryDiff()
+    old_header = old_reader.getHeader()
+    new_header = new_reader.getHeader()
+    diff.compare('header',
+                 {'tools_version': old_header.getToolsVersion(),
+                  'linker_script_hash': old_header.linker_script_hash()},
+                 {'tools_version': new_header.getToolsVersion(),
+                  'linker_script_hash': new_header.linker_script_hash()})
+    diff.compare('linker_script',
+                 dict((f.getFileName(), f.getHash())
+                      for f in old_reader.getLinkerScriptFiles()),
+                 dict((f.getFileName(), f.getHash())
+                      for f in new_reader.getLinkerScriptFiles()))
+    old_objects, old_members, old_archives = getInputFileHashes(old_reader)
+    new_objects, new_members, new_archives = getInputFileHashes(new_reader)
+    diff.compare('object_file', old_objects, new_objects)
+    diff.compare('archive_file', old_archives, new_archives)
+    diff.compare('archive_member', old_members, new_members)
+    diff.compare('output_section',
+                 dict((s.getSectionName(), s.getSectionHash())
+                      for s in old_reader.getOutputSections()),
+                 dict((s.getSectionName(), s.getSectionHash())
+                      for s in new_reader.getOutputSections()))
+    # Rule containers carry nothing but their hash, compare them as sets.
+    diff.compare('rule_container',
+                 dict((r.getRuleHash(), r.getRuleHash())
+                      for r in old_reader.getRuleContainers()),
+                 dict((r.getRuleHash(), r.getRuleHash())
+                      for r in new_reader.getRuleContainers()))
+    placements = []
+    for reader in (old_reader, new_reader):
+        paths = [f.getDecoratedPath() for f in reader.getInputFiles()]
+        out_section_names = [s.getSectionName()
+                             for s in reader.getOutputSections()]
+        placements.append(getSectionPlacements(
+            reader.iterInputSectionRecords(), paths, out_section_names))
+    diff.compare('input_section', placements[0], placements[1])
+    return diff
+
+
+# Read size and digest size used when hashing inputs for DictionaryVerifier.
+HASH_CHUNK_SIZE = 1 << 20
+HASH_DIGEST_SIZE = 16
+
+
+def hashFile(path):
+    '''Return the hex digest of the contents of path.'''
+    digest = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashArchiveMembers(path):
+    '''Return {member name: hex digest} for the members of ar archive path.
+
+    GNU and BSD long member names are supported, as are thin archives whose
+    members are hashed from the files they refer to; their result contains
+    a '!<thin>' key. Only the first of several members with the same name
+    is kept.
+    '''
+    members = {}
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+        if magic not in (b'!<arch>\n', b'!<thin>\n'):
+            raise IOError(path + ' is not an archive')
+        thin = magic == b'!<thin>\n'
+        if thin:
+            # Marks the result, '!' cannot start a member name.
+            members['!<thin>'] = ''
+        long_names = b''
+        while True:
+            header = f.read(60)
+            if len(header) < 60:
+                break
+            name = header[0:16].rstrip(b' ')
+            size = int(header[48:58])
+            # Thin archives only store the symbol and name tables.
+            stored = not thin or name in (b'/', b'//', b'/SYM64/')
+            if name.startswith(b'#1/'):
+                name_length = int(name[3:])
+                name = f.read(name_length).rstrip(b'\0')
+                size -= name_length
+            elif name == b'//':
+                long_names = f.read(size)
+                f.seek(size % 2, os.SEEK_CUR)
+                continue
+            elif name in (b'/', b'/SYM64/', b'__.SYMDEF', b'__.SYMDEF SORTED'):
+                f.seek(size + size % 2, os.SEEK_CUR)
+                continue
+            elif name.startswith(b'/'):
+                start = int(name[1:])
+                name = long_names[start:long_names.index(b'/\n', start)]
+            else:
+                name = name.rstrip(b'/')
+            name = name.decode('utf-8', 'replace')
+            if not stored:
+                if name not in members:
+                    members[name] = hashFile(os.path.join(
+                        os.path.dirname(path), name))
+                continue
+            digest = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+            remaining = size
+            while remaining:
+                chunk = f.read(min(remaining, HASH_CHUNK_SIZE))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+            f.seek(size % 2, os.SEEK_CUR)
+            members.setdefault(name, digest.hexdigest())
+    # Thin archives record paths, the linker reports the base name.
+    for name in list(members):
+        members.setdefault(os.path.basename(name), members[name])
+    return members
+
+
+class DictionaryVerifier(object):
+    '''Check the inputs recorded in a dictionary against the file system.
+
+    The hash function the linker records is not available here, so every
+    input is hashed with blake2b instead and compared with the digest it
+    had when its recorded hash was first verified. An input is 'baseline'
+    the first time it is seen with a recorded hash, afterwards 'unchanged'
+    or 'changed'; inputs that cannot be found are 'missing'. Digests and
+    the size and mtime they were computed at are kept in a JSON stat cache,
+    files whose size and mtime did not change are not read again.
+
+    Only unchanged inputs are cache hits. Baseline inputs were not verified
+    against anything yet, they are neither hits nor misses.
+    '''
+
+    STATE_VERSION = 1
+    HIT = 'unchanged'
+    MISSES = ('changed', 'missing')
+    UNVERIFIED = 'baseline'
+
+    def __init__(self, reader, state_file=None, jobs=None):
+        self.reader = reader
+        self.state_file = state_file or reader.dictfile + '.verify'
+        self.jobs = jobs
+        self.state = {}
+        self.hashed_files = 0
+
+    def loadState(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if state.get('version') == self.STATE_VERSION:
+            self.state = state['files']
+
+    def saveState(self):
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump({'version': self.STATE_VERSION, 'files': self.state},
+                      f, sort_keys=True)
+        os.rename(self.state_file + '.tmp', self.state_file)
+
+    def getInputs(self):
+        '''Return [(kind, key, path, member, recorded hash)], one per input.'''
+        inputs = []
+        seen = set()
+        for f in self.reader.getLinkerScriptFiles():
+            inputs.append(('linker_script', f.getFileName(), f.getFileName(),
+                           None, f.getHash()))
+        for f in self.reader.getInputFiles():
+            if f.getKind() == InputFileKind.ArchiveFileWithMember:
+                archive = f.archivefile.getFileName()
+                if archive not in seen:
+                    seen.add(archive)
+                    inputs.append(('archive_file', archive, archive, None,
+                                   f.archivefile.getHash()))
+                inputs.append(('archive_member', f.getDecoratedPath(),
+                               archive, f.archivemember.getFileName(),
+                               f.archivemember.getHash()))
+            elif f.getFileName() and f.getFileName() not in seen:
+                seen.add(f.getFileName())
+                inputs.append(('object_file', f.getFileName(),
+                               f.getFileName(), None, f.getHash()))
+        return inputs
+
+    def hashPath(self, path, is_archive):
+        '''Return (stat, digests) for path, reusing cached digests if the
+        size and mtime of path did not change since they were computed.
+        '''
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, None
+        stat = [st.st_size, st.st_mtime_ns]
+        cached = self.state.get(path)
+        # Members of thin archives live in other files, always rehash them.
+        if (cached is not None and cached['stat'] == stat and
+                '!<thin>' not in cached['digests']):
+            return stat, cached['digests']
+        try:
+            digests = {}
+            if is_archive:
+                digests = hashArchiveMembers(path)
+            # The empty name stands for the file as a whole.
+            digests[''] = hashFile(path)
+        except (IOError, OSError, ValueError):
+            return stat, None
+        self.hashed_files += 1
+        return stat, digests
+
+    def verify(self):
+        '''Return [(status, kind, key, recorded hash)] for every input.'''
+        self.loadState()
+        inputs = self.getInputs()
+        archives = set(path for kind, _, path, member, _ in inputs
+                       if member is not None)
+        paths = sorted(set(path for _, _, path, _, _ in inputs))
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+            hashed = dict(zip(paths, pool.map(
+                lambda path: self.hashPath(path, path in archives), paths)))
+        results = []
+        state = {}
+        for kind, key, path, member, recorded_hash in inputs:
+            stat, digests = hashed[path]
+            digest = None
+            if digests is not None:
+                digest = digests.get('' if member is None else member)
+            baselines = self.state.get(path, {}).get('baselines', {})
+            baseline = baselines.get(key)
+            if digest is None:
+                status = 'missing'
+            elif baseline is None or baseline[0] != recorded_hash:
+                status = 'baseline'
+                baseline = [recorded_hash, digest]
+            elif baseline[1] == digest:
+                status = 'unchanged'
+            else:
+                status = 'changed'
+            results.append((status, kind, key, recorded_hash))
+            if digests is None:
+                continue
+            entry = state.setdefault(path, {'stat': stat, 'digests': digests,
+                                            'baselines': {}})
+            entry['baselines'][key] = baseline
+        self.state = state
+        self.saveState()
+        return results
+
+
+def printVerifyReport(results, verbose=False):
+    '''Print changed and missing inputs, then counts and predicted hits.
+
+    The hit rate is that of the verified inputs, baseline inputs are left
+    out. Returns True if no input is changed or missing.
+    '''
+    counts = {}
+    for status, kind, key, recorded_hash in results:
+        counts[status] = counts.get(status, 0) + 1
+        if verbose or status in DictionaryVerifier.MISSES:
+            print('{}\t{}\t{}\t{}'.format(status, kind, key, recorded_hash))
+    for status in ((DictionaryVerifier.HIT, DictionaryVerifier.UNVERIFIED) +
+                   DictionaryVerifier.MISSES):
+        print('{} : {}'.format(status, counts.get(status, 0)))
+    hits = counts.get(DictionaryVerifier.HIT, 0)
+    misses = sum(counts.get(status, 0)
+                 for status in DictionaryVerifier.MISSES)
+    if hits + misses:
+        print('Predicted cache hit rate : {:.1f}%'.format(
+            100.0 * hits / (hits + misses)))
+    elif results:
+        print('Predicted cache hit rate : n/a, no input verified yet')
+    return not misses
+
+
+def readInputList(path):
+    '''Return the paths listed in path, one per line, as normalized absolute
+    paths. Relative paths are relative to the directory of path.
+
+    Blank lines and lines starting with # are skipped.
+    '''
+    paths = []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                paths.append(os.path.normpath(os.path.join(base, line)))
+    return paths
+
+
+class LinkPredictor(object):
+    '''Predict which output sections an incremental link can reuse.
+
+    The inputs recorded in the dictionary are hashed in parallel by a
+    DictionaryVerifier and joined with the current input list through a
+    dict keyed by path. An input is dirty if it was removed from the
+    list, changed or missing on disk, or has no verified baseline yet.
+    One pass over the out_section_id, input_id and rule_container_id of
+    every input section and common symbol then marks the output sections
+    and rule containers that hold anything from a dirty input.
+
+    A full link is recommended if a linker script changed, if there are
+    new inputs, whose placement is unknown until the rules are matched,
+    or if more than threshold of the sections must be relaid.
+    '''
+
+    # Only DictionaryVerifier hits can be reused, unverified inputs are
+    # relaid like misses.
+    DIRTY = DictionaryVerifier.MISSES + (DictionaryVerifier.UNVERIFIED,)
+
+    def __init__(self, reader, current_inputs, linker_scripts=None,
+                 state_file=None, jobs=None, threshold=0.5):
+        self.reader = reader
+        self.current_inputs = current_inputs
+        self.linker_scripts = linker_scripts
+        self.verifier = DictionaryVerifier(reader, state_file, jobs)
+        self.threshold = threshold
+        self.changed = []
+        self.removed = []
+        self.new = []
+        self.script_changes = []
+        self.out_sections = []
+        self.totals = array('I')
+        self.relaid = array('I')
+        self.rule_containers = 0
+        self.dirty_rule_containers = 0
+
+    def predict(self):
+        status = {}
+        for result, kind, key, _ in self.verifier.verify():
+            status[key] = result
+            if kind == 'linker_script' and result in self.DIRTY:
+                self.script_changes.append((result, key))
+        if self.linker_scripts is not None:
+            recorded = set(os.path.normpath(f.getFileName())
+                           for f in self.reader.getLinkerScriptFiles())
+            for path in sorted(set(self.linker_scripts) ^ recorded):
+                self.script_changes.append(
+                    ('removed' if path in recorded else 'new', path))
+
+        current = set(self.current_inputs)
+        known = set()
+        inputfiles = self.reader.getInputFiles()
+        dirty = bytearray(len(inputfiles))
+        for input_id, f in enumerate(inputfiles):
+            if f.getKind() == InputFileKind.ArchiveFileWithMember:
+                path = f.archivefile.getFileName()
+            else:
+                path = f.getFileName()
+            if not path:
+                continue
+            key = f.getDecoratedPath()
+            path = os.path.normpath(path)
+            known.add(path)
+            if path not in current:
+                dirty[input_id] = 1
+                self.removed.append(key)
+            elif status.get(key) in self.DIRTY:
+                dirty[input_id] = 1
+                self.changed.append((status[key], key))
+        self.new = [path for path in self.current_inputs if path not in known]
+
+        self.out_sections = self.reader.getOutputSections()
+        totals = array('I', [0]) * len(self.out_sections)
+        relaid = array('I', [0]) * len(self.out_sections)
+        dirty_rules = bytearray(len(self.reader.getRuleContainers()))
+        for records in (self.reader.iterInputSectionRecords(),
+                        self.reader.iterCommonSymbolRecords()):
+            for _, _, out_section_id, input_id, rule_container_id in records:
+                totals[out_section_id] += 1
+                if dirty[input_id]:
+                    relaid[out_section_id] += 1
+                    # Sized from the ids seen, the rule containers may be
+                    # missing from the dictionary.
+                    if rule_container_id >= len(dirty_rules):
+                        dirty_rules.extend(
+                            bytearray(rule_container_id + 1 - len(dirty_rules)))
+                    dirty_rules[rule_container_id] = 1
+        self.totals = totals
+        self.relaid = relaid
+        self.rule_containers = len(dirty_rules)
+        self.dirty_rule_containers = dirty_rules.count(1)
+        return self
+
+    def getReasons(self):
+        '''Return why a full link is needed, empty for an incremental one.'''
+        reasons = []
+        if self.script_changes:
+            reasons.append('linker script changed')
+        if self.new:
+            reasons.append('{} new inputs'.format(len(self.new)))
+        total = sum(self.totals)
+        if total and sum(self.relaid) > self.threshold * total:
+            reasons.append('more than {:.0f}% of sections relaid'.format(
+                100.0 * self.threshold))
+        return reasons
+
+    def dump(self, verbose=False):
+        '''Print the prediction, returns True for an incremental link.'''
+        self.reader.getHeader().printHeader()
+        for status, path in self.script_changes:
+            print('{}\tlinker_script\t{}'.format(status, path))
+        for status, key in self.changed:
+            print('{}\tinput\t{}'.format(status, key))
+        for key in self.removed:
+            print('removed\tinput\t{}'.format(key))
+        for path in self.new:
+            print('new\tinput\t{}'.format(path))
+        reused = 0
+        for out_section_id, x in enumerate(self.out_sections):
+            relaid = self.relaid[out_section_id]
+            if not relaid:
+                reused += 1
+            if verbose or relaid:
+                print('{}\t{}\t{}/{}'.format(
+                    'relayout' if relaid else 'reuse', x.getSectionName(),
+                    relaid, self.totals[out_section_id]))
+        print('Output sections reused : {}'.format(reused))
+        print('Output sections relaid : {}'.format(
+            len(self.out_sections) - reused))
+        print('Sections relaid : {}/{}'.format(sum(self.relaid),
+                                               sum(self.totals)))
+        print('Rule containers affected : {}/{}'.format(
+            self.dirty_rule_containers, self.rule_containers))
+        reasons = self.getReasons()
+        if reasons:
+            print('Recommended link : full ({})'.format(', '.join(reasons)))
+        else:
+            print('Recommended link : incremental')
+        return not reasons
+
+
+def aggregateByInputFile(reader):
+    '''Count input sections and common symbols per archive and per object.
+
+    The input_id columns are counted in one pass each with a Counter, the
+    per-input counts are then folded into their archive. Returns
+    (archives, objects): lists of (sections, symbols, members, path) and
+    (sections, symbols, path) tuples, the largest section counts first.
+    '''
+    section_counts = collections.Counter(reader.getInputIds())
+    symbol_counts = collections.Counter(reader.getInputIds(symbols=True))
+    archives = collections.OrderedDict()
+    objects = []
+    for input_id, inputfile in enumerate(reader.getInputFiles()):
+        sections = section_counts.get(input_id, 0)
+        symbols = symbol_counts.get(input_id, 0)
+        if inputfile.getKind() == InputFileKind.ArchiveFileWithMember:
+            archivefile = inputfile.archivefile
+            totals = archives.get(archivefile)
+            if totals is None:
+                totals = archives[archivefile] = [0, 0, 0]
+            totals[0] += sections
+            totals[1] += symbols
+            totals[2] += 1
+        elif inputfile.getFileName():
+            objects.append((sections, symbols, inputfile.getFileName()))
+    archives = [(sections, symbols, members, archivefile.getFileName())
+                for archivefile, (sections, symbols, members)
+                in archives.items()]
+    archives.sort(key=lambda row: (-row[0], -row[1], row[3]))
+    objects.sort(key=lambda row: (-row[0], -row[1], row[2]))
+    return archives, objects
+
+
+def printArchiveReport(archives, objects):
+    print('Sections\tCommon Symbols\tMembers\tArchive')
+    print('-' * 80)
+    for sections, symbols, members, path in archives:
+        print('{}\t{}\t{}\t{}'.format(sections, symbols, members, path))
+    print('')
+    print('Sections\tCommon Symbols\tObject')
+    print('-' * 80)
+    for sections, symbols, path in objects:
+        print('{}\t{}\t{}'.format(sections, symbols, path))
+
+
+SQLITE_SCHEMA = '''
+CREATE TABLE header (tools_major_version INTEGER, tools_minor_version INTEGER,
+                     linker_script_hash INTEGER);
+CREATE TABLE object_files (id INTEGER PRIMARY KEY, file_name TEXT,
+                           file_hash INTEGER, name_hash INTEGER);
+CREATE TABLE archive_files (id INTEGER PRIMARY KEY, file_name TEXT,
+                            file_hash INTEGER, name_hash INTEGER);
+CREATE TABLE archive_members (id INTEGER PRIMARY KEY, member_name TEXT,
+                              member_hash INTEGER, member_name_hash INTEGER);
+CREATE TABLE linker_script_files (id INTEGER PRIMARY KEY, file_name TEXT,
+                                  file_hash INTEGER);
+CREATE TABLE input_files (
+    id INTEGER PRIMARY KEY,
+    object_file_id INTEGER REFERENCES object_files,
+    archive_file_id INTEGER REFERENCES archive_files,
+    archive_member_id INTEGER REFERENCES archive_members);
+CREATE TABLE output_sections (id INTEGER PRIMARY KEY, section_name TEXT,
+                              hash INTEGER, section_index INTEGER);
+CREATE TABLE rule_containers (id INTEGER PRIMARY KEY, rule_hash INTEGER);
+CREATE TABLE input_sections (
+    id INTEGER PRIMARY KEY, section_name TEXT, hash INTEGER,
+    out_section_id INTEGER REFERENCES output_sections,
+    input_id INTEGER REFERENCES input_files,
+    rule_container_id INTEGER REFERENCES rule_containers);
+CREATE TABLE common_symbols (
+    id INTEGER PRIMARY KEY, symbol_name TEXT, symbol_hash INTEGER,
+    out_section_id INTEGER REFERENCES output_sections,
+    input_id INTEGER REFERENCES input_files,
+    rule_container_id INTEGER REFERENCES rule_containers);
+CREATE VIEW input_file_paths AS
+    SELECT i.id AS id,
+           CASE WHEN i.archive_file_id IS NULL THEN o.file_name
+                ELSE a.file_name || '(' || m.member_name || ')' END AS path,
+           a.file_name AS archive_name,
+           m.member_name AS member_name
+    FROM input_files i
+    LEFT JOIN object_files o ON o.id = i.object_file_id
+    LEFT JOIN archive_files a ON a.id = i.archive_file_id
+    LEFT JOIN archive_members m ON m.id = i.archive_member_id;
+'''
+
+# Created after the bulk load, which is faster than maintaining them per row.
+SQLITE_INDEXES = '''
+CREATE INDEX object_files_name ON object_files (file_name);
+CREATE INDEX archive_files_name ON archive_files (file_name);
+CREATE INDEX archive_members_name ON archive_members (member_name);
+CREATE INDEX input_files_object ON input_files (object_file_id);
+CREATE INDEX input_files_archive ON input_files (archive_file_id);
+CREATE INDEX output_sections_name ON output_sections (section_name);
+CREATE INDEX input_sections_name ON input_sections (section_name);
+CREATE INDEX input_sections_placement
+    ON input_sections (out_section_id, input_id);
+CREATE INDEX input_sections_input ON input_sections (input_id);
+CREATE INDEX input_sections_rule ON input_sections (rule_container_id);
+CREATE INDEX common_symbols_name ON common_symbols (symbol_name);
+CREATE INDEX common_symbols_placement
+    ON common_symbols (out_section_id, input_id);
+CREATE INDEX common_symbols_input ON common_symbols (input_id);
+CREATE INDEX common_symbols_rule ON common_symbols (rule_container_id);
+'''
+
+SQLITE_TABLES = ('header', 'object_files', 'archive_files', 'archive_members',
+                 'linker_script_files', 'input_files', 'output_sections',
+                 'rule_containers', 'input_sections', 'common_symbols')
+
+
+def toSQLiteInteger(value):
+    '''Map a uint64 hash onto the signed 64-bit integers SQLite stores.'''
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def exportSQLite(reader, dbfile):
+    '''Bulk-load the dictionary of reader into the SQLite database dbfile.
+
+    Every table is recreated and filled with executemany in one
+    transaction, ids are the positions in the dictionary so they match the
+    ids its records refer to. Hashes are stored as signed integers, see
+    toSQLiteInteger. Input sections and common symbols are streamed from
+    the reader, so the lazy and stream modes export without materializing
+    them. All input sections of archive X placed into output section Y:
+
+      SELECT s.section_name, p.member_name FROM input_sections s
+        JOIN input_file_paths p ON p.id = s.input_id
+        JOIN output_sections o ON o.id = s.out_section_id
+        WHERE p.archive_name = 'X' AND o.section_name = 'Y';
+    '''
+    caching_info_dict = reader.caching_info_dict
+    h = toSQLiteInteger
+    import sqlite3
+    db = sqlite3.connect(dbfile, isolation_level=None)
+    try:
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(
+            'BEGIN; DROP VIEW IF EXISTS input_file_paths;' +
+            ''.join('DROP TABLE IF EXISTS {};'.format(table)
+                    for table in SQLITE_TABLES) +
+            SQLITE_SCHEMA + 'COMMIT;')
+        db.execute('BEGIN')
+
+        header = caching_info_dict.dictionary_header
+        db.execute('INSERT INTO header VALUES (?, ?, ?)',
+                   (header.tools_major_version, header.tools_minor_version,
+                    h(header.linker_script_hash)))
+        db.executemany('INSERT INTO object_files VALUES (?, ?, ?, ?)',
+                       ((i, f.file_name, h(f.file_hash), h(f.name_hash))
+                        for i, f in enumerate(caching_info_dict.object_files)))
+        db.executemany('INSERT INTO archive_files VALUES (?, ?, ?, ?)',
+                       ((i, f.file_name, h(f.file_hash), h(f.name_hash))
+                        for i, f in enumerate(caching_info_dict.archive_files)))
+        db.executemany('INSERT INTO archive_members VALUES (?, ?, ?, ?)',
+                       ((i, m.member_name, h(m.member_hash),
+                         h(m.member_name_hash))
+                        for i, m in enumerate(
+                            caching_info_dict.archive_members)))
+        db.executemany('INSERT INTO linker_script_files VALUES (?, ?, ?)',
+                       ((i, f.file_name, h(f.file_hash))
+                        for i, f in enumerate(
+                            caching_info_dict.linker_script_files)))
+        # A zero archive_file_id marks a plain object file, otherwise
+        # object_file_id is the index of the archive member.
+        db.executemany('INSERT INTO input_files VALUES (?, ?, ?, ?)',
+                       ((i, None, f.archive_file_id, f.object_file_id)
+                        if f.archive_file_id else
+                        (i, f.object_file_id, None, None)
+                        for i, f in enumerate(caching_info_dict.input_files)))
+        db.executemany('INSERT INTO output_sections VALUES (?, ?, ?, ?)',
+                       ((i, s.section_name, h(s.hash), h(s.section_index))
+                        for i, s in enumerate(
+                            caching_info_dict.output_sections)))
+        db.executemany('INSERT INTO rule_containers VALUES (?, ?)',
+                       ((i, h(r.rule_hash)) for i, r in enumerate(
+                           caching_info_dict.rule_containers)))
+        with reader.phase('sqlite'):
+            db.executemany('INSERT INTO input_sections VALUES '
+                           '(?, ?, ?, ?, ?, ?)',
+                           ((i, name, h(hash), out_section_id, input_id,
+                             rule_container_id)
+                            for i, (name, hash, out_section_id, input_id,
+                                    rule_container_id)
+                            in enumerate(reader.iterInputSectionRecords())))
+            db.executemany('INSERT INTO common_symbols VALUES '
+                           '(?, ?, ?, ?, ?, ?)',
+                           ((i, name, h(hash), out_section_id, input_id,
+                             rule_container_id)
+                            for i, (name, hash, out_section_id, input_id,
+                                    rule_container_id)
+                            in enumerate(reader.iterCommonSymbolRecords())))
+            for statement in SQLITE_INDEXES.split(';'):
+                if statement.strip():
+                    db.execute(statement)
+            db.execute('COMMIT')
+        db.execute('ANALYZE')
+    except BaseException:
+        if db.in_transaction:
+            db.execute('ROLLBACK')
+        raise
+    finally:
+        db.close()
@@ -1,18 +1,562 @@
-#!/pkg/qct/software/python/3.4.0/bin/python
+#!/usr/bin/env python3
 
 import argparse
+import csv
+import gzip
+import hashlib
+import itertools
+import json
+import lzma
+import marshal
+import mmap
+import multiprocessing
 import os
+import re
 import sys
 import yaml
 try:
     from yaml import CLoader as Loader
+    from yaml.cyaml import CParser
 except ImportError:
     print("Warning: Missing CLoader - long run time is likely.")
     from yaml import Loader
+    CParser = None
+
+if CParser is not None:
+    class MapLoader(CParser, yaml.constructor.Constructor,
+                    yaml.resolver.Resolver):
+        '''CLoader without the composer, see load_yaml_map.'''
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            yaml.constructor.Constructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+else:
+    MapLoader = Loader
+
+STR_TAG = 'tag:yaml.org,2002:str'
+
+
+def construct_event(loader, event, anchors):
+    '''Return the Python object of the node that starts with event.
+
+    Objects are built straight from the parser events, scalars are resolved
+    and constructed the way yaml.load does, without building the node tree
+    first.
+    '''
+    cls = type(event)
+    if cls is yaml.ScalarEvent:
+        value = event.value
+        tag = event.tag
+        if tag is None and event.implicit[0]:
+            tag = loader.resolve(yaml.ScalarNode, value, event.implicit)
+        elif tag is None or tag == '!':
+            tag = STR_TAG
+        if tag == STR_TAG:
+            data = value
+        elif tag in loader.yaml_constructors:
+            data = loader.yaml_constructors[tag](
+                loader, yaml.ScalarNode(tag, value))
+        else:
+            data = loader.construct_document(yaml.ScalarNode(tag, value))
+    elif cls is yaml.MappingStartEvent:
+        data = {}
+        if event.anchor is not None:
+            anchors[event.anchor] = data
+        event = loader.get_event()
+        while type(event) is not yaml.MappingEndEvent:
+            key = construct_event(loader, event, anchors)
+            data[key] = construct_event(loader, loader.get_event(), anchors)
+            event = loader.get_event()
+        return data
+    elif cls is yaml.SequenceStartEvent:
+        data = []
+        if event.anchor is not None:
+            anchors[event.anchor] = data
+        event = loader.get_event()
+        while type(event) is not yaml.SequenceEndEvent:
+            data.append(construct_event(loader, event, anchors))
+            event = loader.get_event()
+        return data
+    elif cls is yaml.AliasEvent:
+        return anchors[event.anchor]
+    else:
+        raise yaml.YAMLError('unexpected event ' + str(event))
+    if event.anchor is not None:
+        anchors[event.anchor] = data
+    return data
+
+
+def skip_event(loader, event):
+    '''Consume the rest of the node that starts with event.'''
+    depth = 0
+    while True:
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+        event = loader.get_event()
+
+
+def load_yaml_map(stream, keep=None, visitors=None):
+    '''Load the linker map in stream one top-level key at a time.
+
+    Return (document, keys) where keys are all the top-level keys of the map.
+    Only the keys in keep, or all of them if keep is None, are stored in
+    document. The items of a sequence under a key of visitors are passed to
+    the function visitors[key] as soon as they are parsed and are not
+    stored, so memory use is bounded by the largest item rather than the
+    whole map. A map that is not a mapping is loaded as a whole.
+    '''
+    loader = MapLoader(stream)
+    anchors = {}
+    try:
+        loader.get_event()
+        if loader.check_event(yaml.StreamEndEvent):
+            return None, set()
+        loader.get_event()
+        event = loader.get_event()
+        if type(event) is not yaml.MappingStartEvent:
+            return construct_event(loader, event, anchors), set()
+        document = {}
+        keys = set()
+        event = loader.get_event()
+        while type(event) is not yaml.MappingEndEvent:
+            key = construct_event(loader, event, anchors)
+            keys.add(key)
+            event = loader.get_event()
+            if (visitors and key in visitors and
+                    type(event) is yaml.SequenceStartEvent):
+                event = loader.get_event()
+                while type(event) is not yaml.SequenceEndEvent:
+                    item = construct_event(loader, event, anchors)
+                    visitors[key](item)
+                    event = loader.get_event()
+            elif keep is None or key in keep:
+                document[key] = construct_event(loader, event, anchors)
+            else:
+                skip_event(loader, event)
+            event = loader.get_event()
+        return document, keys
+    finally:
+        loader.dispose()
+
+
+class YAMLMapCache(object):
+    '''Snapshots of parsed maps, kept in cache_dir.
+
+    A snapshot is found by the path, size and mtime of its map and is only
+    used if the map still has the content hash recorded in it. Whenever the
+    snapshots take more than max_size bytes, the least recently used ones
+    are removed.
+
+    Snapshots are written with marshal, which cannot run code when loaded
+    as pickle can, and are only loaded if owned by the current user and not
+    writable by others. marshal is still not hardened against crafted data,
+    cache_dir must only be writable by users trusted to run this script.
+    Maps with values marshal cannot store, timestamps for instance, are not
+    cached.
+    '''
+
+    VERSION = 2
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def get_key(self, path):
+        '''Return (snapshot path, content hash) for the map at path.'''
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        name = hashlib.blake2b('{}\0{}\0{}'.format(
+            path, st.st_size, st.st_mtime_ns).encode(), digest_size=16)
+        content = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                content.update(chunk)
+        return (os.path.join(self.cache_dir, name.hexdigest() + '.snapshot'),
+                content.hexdigest())
+
+    def is_trusted(self, st):
+        '''Return True if the file with os.stat result st was written by
+        the current user and cannot be changed by others.
+        '''
+        if st.st_mode & 0o022:
+            return False
+        return not hasattr(os, 'getuid') or st.st_uid == os.getuid()
+
+    def load(self, key):
+        '''Return the document of the snapshot for key, None if there is
+        none, it is stale or it is not trusted.
+        '''
+        snapshot, content_hash = key
+        try:
+            with open(snapshot, 'rb') as f:
+                if not self.is_trusted(os.fstat(f.fileno())):
+                    return None
+                # marshal.load reads a file in small pieces, loads of the
+                # read data is several times faster.
+                size = int.from_bytes(f.read(4), 'little')
+                header = marshal.loads(f.read(size))
+                if header != (self.VERSION, content_hash):
+                    return None
+                document = marshal.loads(f.read())
+            # The mtime of a snapshot records when it was last used.
+            os.utime(snapshot)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+        return document
+
+    def store(self, key, document):
+        '''Write the snapshot of document for key, then evict.'''
+        snapshot, content_hash = key
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        try:
+            with open(snapshot + '.tmp', 'wb') as f:
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(f.fileno(), 0o644)
+                header = marshal.dumps((self.VERSION, content_hash))
+                data = marshal.dumps(document)
+                f.write(len(header).to_bytes(4, 'little'))
+                f.write(header)
+                f.write(data)
+        except ValueError:
+            os.remove(snapshot + '.tmp')
+            return
+        os.replace(snapshot + '.tmp', snapshot)
+        self.evict()
+
+    def evict(self):
+        '''Remove the least recently used snapshots above max_size.
+
+        Another process may evict from the same cache_dir meanwhile, files
+        that are already gone are skipped.
+        '''
+        snapshots = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.snapshot'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshots.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in snapshots)
+        # The snapshot just written is the most recent and is kept last.
+        for _, size, path in sorted(snapshots)[:-1]:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+class RangeReader(object):
+    '''Read-only file object over prefix and then the byte ranges of a file,
+    in order.
+    '''
+
+    def __init__(self, f, ranges, prefix=b''):
+        self.f = f
+        self.ranges = list(ranges)
+        self.prefix = prefix
+        self.pos = self.end = 0
+
+    def read(self, size=-1):
+        if self.prefix:
+            data, self.prefix = self.prefix, b''
+            return data
+        if size < 0:
+            return b''.join(iter(lambda: self.read(1 << 20), b''))
+        while self.pos == self.end:
+            if not self.ranges:
+                return b''
+            self.pos, self.end = self.ranges.pop(0)
+            self.f.seek(self.pos)
+        data = self.f.read(min(size, self.end - self.pos))
+        self.pos += len(data)
+        return data
+
+
+def split_output_sections(f, jobs):
+    '''Split the OutputSections of the map in file f for jobs workers.
+
+    Return (rest, partitions): the byte ranges of the map without the items
+    of OutputSections and the byte ranges of about equal runs of items, in
+    map order. The split relies on the block layout the linker writes, with
+    OutputSections: at the start of a line and each item starting a line
+    with the same indentation. Returns None for any other layout.
+    '''
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        match = re.compile(br'(?m)^OutputSections:[ \t]*\n').search(data)
+        if match is None:
+            return None
+        start = match.end()
+        item = re.compile(br'( *- )').match(data, start)
+        if item is None:
+            return None
+        indicator = b'\n' + item.group(1)
+        # The next top-level key, document end or document marker.
+        end = re.compile(br'\n(?:[^ \t\n#-]|---)').search(data, start - 1)
+        end = len(data) if end is None else end.start() + 1
+        partitions = []
+        pos = start
+        for job in range(1, jobs + 1):
+            split = end
+            if job < jobs:
+                split = data.find(indicator, start + (end - start) * job // jobs,
+                                  end)
+                split = end if split < 0 else split + 1
+            if split > pos:
+                partitions.append((pos, split))
+                pos = split
+        return [(0, start), (end, len(data))], partitions
+    finally:
+        data.close()
+
+
+def aggregate_partition(args):
+    '''Collect topics from the items of OutputSections in the byte range of
+    the map at path, in a worker process.
+    '''
+    path, (start, end), topics = args
+    with open(path, 'rb') as f:
+        # The items are a sequence under OutputSections again.
+        yamlfile = YAMLFile(RangeReader(f, [(start, end)], b'OutputSections:\n'),
+                            set(), topics)
+    return (yamlfile.objs, yamlfile.lib_objs, yamlfile.generated,
+            yamlfile.linker_script['zi_data'], yamlfile.symbol_sections,
+            yamlfile.classifier, yamlfile.output_section_sizes)
+
+
+def classify_section(sec_type, permission):
+    '''Return (section type, debug) of sections of ELF type sec_type with
+    the flags permission. The section type is code, ro_data, rw_data,
+    zi_data or None; sections of type None are debug sections if debug is
+    True and their name starts with .debug_.
+    '''
+    if 'SHT_REL' in sec_type:
+        return (None, False)
+    alloc = 'SHF_ALLOC' in permission
+    write = 'SHF_WRITE' in permission
+    execinstr = 'SHF_EXECINSTR' in permission
+    if 'SHT_PROGBITS' in sec_type:
+        if alloc and execinstr:
+            return ('code', False)
+        if alloc and not write:
+            return ('ro_data', False)
+        if alloc:
+            return ('rw_data', False)
+        return (None, not write and not execinstr)
+    if 'SHT_NOBITS' in sec_type and alloc and write and not execinstr:
+        return ('zi_data', False)
+    return (None, False)
+
+
+class SectionClassifier(object):
+    '''Classify sections with classify_section, once per distinct
+    (Type, Permissions) pair, a Permissions list as a tuple.
+
+    hits and misses count the lookups of sections with a Type and
+    Permissions that were and were not classified before.
+    '''
+
+    def __init__(self):
+        self.classes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def classify(self, item):
+        '''Return classify_section of the Type and Permissions of item,
+        (None, False) if it has none.
+        '''
+        if 'Type' not in item or 'Permissions' not in item:
+            return (None, False)
+        permission = item['Permissions']
+        # A scalar is tested with substring checks and must stay whole.
+        if isinstance(permission, list):
+            permission = tuple(permission)
+        key = (item['Type'], permission)
+        try:
+            res = self.classes[key]
+        except KeyError:
+            self.misses += 1
+            res = self.classes[key] = classify_section(*key)
+            return res
+        self.hits += 1
+        return res
+
+    def update(self, other):
+        '''Add the classes and counts of the SectionClassifier other.'''
+        self.classes.update(other.classes)
+        self.hits += other.hits
+        self.misses += other.misses
+
+    def get_stats(self):
+        '''Return {'hits', 'misses', 'classes'}.'''
+        return {'hits': self.hits, 'misses': self.misses,
+                'classes': len(self.classes)}
+
+
+class ReportWriter(object):
+    '''Write report text to the file f in large batches.
+
+    Text passed to write, also by print while the writer is sys.stdout, is
+    joined and written with one f.write per batch_size characters. Rows are
+    best written with write_rows, which formats them with a %-template; that
+    is about twice as fast as str.format.
+    '''
+
+    ROWS_PER_BATCH = 4096
+
+    def __init__(self, f, batch_size=1 << 20, close_file=False):
+        self.f = f
+        self.batch_size = batch_size
+        self.close_file = close_file
+        self.buffer = []
+        self.size = 0
+
+    @staticmethod
+    def open(path):
+        '''Return a ReportWriter for a new file at path, compressed with gzip
+        if path ends in .gz and with xz if it ends in .xz.
+        '''
+        if path.endswith('.gz'):
+            f = gzip.open(path, 'wt', compresslevel=6)
+        elif path.endswith('.xz'):
+            f = lzma.open(path, 'wt', preset=1)
+        else:
+            f = open(path, 'w')
+        return ReportWriter(f, close_file=True)
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.batch_size:
+            self.flush()
+        return len(text)
+
+    def write_rows(self, template, rows):
+        '''Write template % row and a newline for each tuple in rows.'''
+        format = (template + '\n').__mod__
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.ROWS_PER_BATCH))
+            if not batch:
+                return
+            self.write(''.join(map(format, batch)))
+
+    def flush(self):
+        if self.buffer:
+            self.f.write(''.join(self.buffer))
+            self.buffer = []
+            self.size = 0
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+        if self.close_file:
+            self.f.close()
+
+
+def write_rows(template, rows):
+    '''Write template % row and a newline for each tuple in rows to
+    sys.stdout.
+    '''
+    out = sys.stdout
+    if isinstance(out, ReportWriter):
+        out.write_rows(template, rows)
+        return
+    out = ReportWriter(out)
+    out.write_rows(template, rows)
+    out.flush()
+
+
+# The fields of the records of each topic of --format.
+SIZE_FIELDS = ('code', 'data', 'ro_data', 'rw_data', 'zi_data', 'debug')
+RECORD_FIELDS = {
+    'architecture': ('architecture', 'emulation', 'address_size'),
+    'sizes': ('kind', 'name') + SIZE_FIELDS,
+    'summarysizes': ('kind', 'name') + SIZE_FIELDS,
+    'totals': ('kind', 'name') + SIZE_FIELDS,
+    'unused': ('section', 'origin', 'size'),
+    'unusedsymbols': ('symbol',),
+    'unusedobjects': ('path', 'member'),
+    'symbols': ('scope', 'symbol', 'value', 'type', 'size', 'object'),
+    'map': ('load_region', 'execution_region', 'address', 'size', 'type',
+            'attr', 'section', 'origin'),
+    'xref': ('symbol', 'referenced_by'),
+    'trampolines': ('output_section', 'to_section', 'name', 'caller',
+                    'callee'),
+    'diff': ('kind', 'name', 'status') + SIZE_FIELDS,
+    'budget': ('kind', 'name', 'region', 'used', 'limit', 'status'),
+}
+
+
+class RecordWriter(object):
+    '''Write records to the ReportWriter out as they are produced.
+
+    Each record is a tuple of the RECORD_FIELDS of its topic. With json the
+    records are the objects of one array, with jsonl one object per line,
+    both with an extra topic member. With csv a header row, topic and the
+    field names, starts every run of records of one topic.
+    '''
+
+    FORMATS = ('csv', 'json', 'jsonl')
+
+    def __init__(self, out, format):
+        self.out = out
+        self.format = format
+        self.topic = None
+        self.separator = '[\n'
+        self.encode = json.JSONEncoder(check_circular=False).encode
+        self.csv = csv.writer(out, lineterminator='\n')
+
+    def write_records(self, topic, records):
+        fields = RECORD_FIELDS[topic]
+        if self.format == 'csv':
+            if topic != self.topic:
+                self.csv.writerow(('topic',) + fields)
+                self.topic = topic
+            self.csv.writerows((topic,) + record for record in records)
+            return
+        keys = ('topic',) + fields
+        encode = self.encode
+        if self.format == 'jsonl':
+            for record in records:
+                self.out.write(encode(dict(zip(keys, (topic,) + record)))
+                               + '\n')
+            return
+        for record in records:
+            self.out.write(self.separator +
+                           encode(dict(zip(keys, (topic,) + record))))
+            self.separator = ',\n'
+
+    def close(self):
+        if self.format == 'json':
+            if self.separator == '[\n':
+                self.out.write('[]\n')
+            else:
+                self.out.write('\n]\n')
+
 
 class YAMLFile(object):
-    def __init__(self, yamlfile):
-        self.yamlfile = yaml.load(yamlfile, Loader=Loader)
+    def __init__(self, yamlfile, keep=None, streamed=(), cache=None, jobs=1):
+        '''Load yamlfile, a linker map.
+
+        With keep, only the top-level keys in keep are loaded. The data of the
+        topics in streamed (sizes, symbols, budget, unused and unusedsymbols)
+        is collected while the map is parsed, their sections are not kept.
+        With jobs, the output sections are split among that many worker
+        processes for the sizes, symbols and budget topics. With a
+        YAMLMapCache, the whole map is loaded from or saved to cache instead,
+        keep, streamed and jobs are ignored.
+        '''
         self.grand_totals = {}
         self.objs = {}
         self.obj_totals = {}
@@ -26,6 +570,154 @@ class YAMLFile(object):
         self.unused = {}
         self.object_map_code = {}
         self.unused_symbols = []
+        self.symbol_sections = []
+        self.symbols = None
+        self.section_symbols = None
+        self.classifier = SectionClassifier()
+        self.output_section_sizes = {}
+        if cache is not None:
+            self.collected = set()
+            key = cache.get_key(yamlfile.name)
+            self.yamlfile = cache.load(key)
+            if self.yamlfile is None:
+                self.yamlfile = load_yaml_map(yamlfile)[0]
+                cache.store(key, self.yamlfile)
+            self.keys = set()
+            if isinstance(self.yamlfile, dict):
+                self.keys = set(self.yamlfile)
+            return
+        self.collected = set(streamed)
+        parallel = self.collected & set(['sizes', 'symbols', 'budget'])
+        if (jobs > 1 and parallel and keep is not None and
+                'OutputSections' not in keep):
+            with open(yamlfile.name, 'rb') as f:
+                split = split_output_sections(f, jobs)
+                if split is not None:
+                    self.load_parallel(f, keep, split, parallel)
+                    return
+        self.yamlfile, self.keys = load_yaml_map(
+            yamlfile, keep, self.get_visitors(self.collected))
+
+    def load_parallel(self, f, keep, split, topics):
+        '''Load the map in file f, collecting topics from the partitions of
+        OutputSections in a process pool while the rest is parsed here.
+
+        The partial results are merged in map order, so objs, lib_objs,
+        generated and the symbols are the same as after a serial load.
+        '''
+        rest, partitions = split
+        pool = multiprocessing.Pool(len(partitions))
+        try:
+            results = pool.map_async(aggregate_partition, [
+                (f.name, partition, topics) for partition in partitions])
+            self.yamlfile, self.keys = load_yaml_map(
+                RangeReader(f, rest), keep,
+                self.get_visitors(self.collected - topics))
+            results = results.get()
+        finally:
+            pool.close()
+            pool.join()
+        for (objs, lib_objs, generated, zi_data, symbol_sections,
+             classifier, output_section_sizes) in results:
+            for merged, sizes in ((self.objs, objs),
+                                  (self.lib_objs, lib_objs)):
+                for origin, v in sizes.items():
+                    if origin not in merged:
+                        merged[origin] = v
+                    else:
+                        for t in v:
+                            merged[origin][t] += v[t]
+            if generated:
+                if not self.generated:
+                    self.generated = generated
+                else:
+                    for t in generated:
+                        self.generated[t] += generated[t]
+            self.linker_script['zi_data'] += zi_data
+            self.symbol_sections.extend(symbol_sections)
+            self.classifier.update(classifier)
+            for name, size in output_section_sizes.items():
+                self.output_section_sizes[name] = (
+                    self.output_section_sizes.get(name, 0) + size)
+
+    def get_visitors(self, topics):
+        '''Return {top-level key: function} collecting the data of topics
+        (sizes, symbols, budget, unused and unusedsymbols) from each item
+        under the key.
+        '''
+        visitors = {}
+        output_topics = set(topics) & set(['sizes', 'symbols', 'budget'])
+        if output_topics:
+            visitors['OutputSections'] = (
+                lambda osection: self.aggregate_output_section(
+                    osection, output_topics))
+        discarded_topics = set(topics) & set(['unused', 'unusedsymbols'])
+        if discarded_topics:
+            visitors['DiscardedSections'] = (
+                lambda section: self.aggregate_discarded_section(
+                    section, discarded_topics))
+        return visitors
+
+    def aggregate(self, topics):
+        '''Collect the data of every topic not collected yet in a single pass
+        over OutputSections and one over DiscardedSections.
+        '''
+        topics = set(topics) - self.collected
+        if not topics or not isinstance(self.yamlfile, dict):
+            return
+        self.collected |= topics
+        for key, visit in self.get_visitors(topics).items():
+            if key in self.yamlfile:
+                for item in self.yamlfile[key]:
+                    visit(item)
+
+    def aggregate_output_section(self, osection, topics):
+        '''Add the sizes and remember the symbols of osection for topics.
+
+        Every input section is visited and classified once, whichever topics
+        are requested.
+        '''
+        if 'budget' in topics:
+            name = self.get_name(osection)
+            self.output_section_sizes[name] = (
+                self.output_section_sizes.get(name, 0) + self.get_size(osection))
+        sizes = False
+        if 'sizes' in topics:
+            sec_type = self.get_section_type(osection)
+            if sec_type:
+                if osection['Contents'] is None:
+                    self.update_object_sizes_no_content(osection, sec_type)
+                else:
+                    sizes = True
+        symbols = 'symbols' in topics and osection.get('Contents')
+        if not sizes and not symbols:
+            return
+        ret = False
+        for isection in osection['Contents']:
+            if sizes:
+                new_sec_type = self.get_section_type(isection) or sec_type
+                if self.update_object_sizes(isection, new_sec_type):
+                    ret = True
+            if symbols and 'Symbols' in isection:
+                self.symbol_sections.append(isection)
+        # Check if all of the content was able to be parsed. If the content
+        # cannot be parsed, the size of the payload is the size of the
+        # output section.
+        if sizes and ret is False:
+            self.update_linker_script_size(osection, sec_type, osection['Size'])
+
+    def aggregate_discarded_section(self, section, topics):
+        '''Add the discarded section to unused and its symbols to
+        unused_symbols for topics.
+        '''
+        if 'unused' in topics:
+            self.unused[self.get_name(section)] = {
+                'origin': self.get_origin(section),
+                'size': self.get_size(section)
+                }
+        if 'unusedsymbols' in topics and 'Symbols' in section:
+            for sym in section['Symbols']:
+                self.unused_symbols.append(sym['Symbol'])
 
     def get_architecture(self):
         '''Return Header->Architecture.'''
@@ -41,84 +733,30 @@ class YAMLFile(object):
 
     def is_code(self, item):
         '''Return True if item is code, otherwise return False.'''
-        res = False
-        if 'Type' in item and 'Permissions' in item:
-            permission = item['Permissions']
-            if ('SHT_PROGBITS' in item['Type'] and
-                'SHF_ALLOC' in permission and
-                'SHF_EXECINSTR' in permission and
-                not 'SHT_REL' in item['Type']):
-                res = True
-        return res
+        return self.classifier.classify(item)[0] == 'code'
 
     def is_ro_data(self, item):
         '''Return True if item is RO data, otherwise return False.'''
-        res = False
-        if 'Type' in item and 'Permissions' in item:
-            permission = item['Permissions']
-            if ('SHT_PROGBITS' in item['Type'] and
-                'SHF_ALLOC' in permission and
-                not 'SHF_WRITE' in permission and
-                not 'SHF_EXECINSTR' in permission and
-                not 'SHT_REL' in item['Type']):
-                res = True
-        return res
+        return self.classifier.classify(item)[0] == 'ro_data'
 
     def is_rw_data(self, item):
         '''Return True if item is RW data, otherwise return False.'''
-        res = False
-        if 'Type' in item and 'Permissions' in item:
-            permission = item['Permissions']
-            if ('SHT_PROGBITS' in item['Type'] and
-                'SHF_ALLOC' in permission and
-                'SHF_WRITE' in permission and
-                not 'SHF_EXECINSTR' in permission and
-                not 'SHT_REL' in item['Type']):
-                res = True
-        return res
+        return self.classifier.classify(item)[0] == 'rw_data'
 
     def is_zi_data(self, item):
         '''Return True if item is ZI data, otherwise return False.'''
-        res = False
-        if 'Type' in item and 'Permissions' in item:
-            permission = item['Permissions']
-            if ('SHT_NOBITS' in item['Type'] and
-                'SHF_ALLOC' in permission and
-                'SHF_WRITE' in permission and
-                not 'SHF_EXECINSTR' in permission and
-                not 'SHT_REL' in item['Type']):
-                res = True
-        return res
+        return self.classifier.classify(item)[0] == 'zi_data'
 
     def is_debug(self, item):
         '''Return True if item is debug, otherwise return False.'''
-        res = False
-        if 'Type' in item and 'Permissions' in item:
-            permission = item['Permissions']
-            if ('SHT_PROGBITS' in item['Type'] and
-                not 'SHF_ALLOC' in permission and
-                not 'SHF_WRITE' in permission and
-                not 'SHF_EXECINSTR' in permission and
-                not 'SHT_REL' in item['Type']):
-                name = self.get_name(item)
-                if name.startswith('.debug_'):
-                    res = True
-        return res
+        return self.get_section_type(item) == 'debug'
 
     def get_section_type(self, section):
         '''Return section type.'''
-        if self.is_code(section):
-            return 'code'
-        elif self.is_ro_data(section):
-            return 'ro_data'
-        elif self.is_rw_data(section):
-            return 'rw_data'
-        elif self.is_zi_data(section):
-            return 'zi_data'
-        elif self.is_debug(section):
+        sec_type, debug = self.classifier.classify(section)
+        if debug and self.get_name(section).startswith('.debug_'):
             return 'debug'
-        else:
-            return None
+        return sec_type
 
     def is_lib_member(self, item):
         '''Return True if item is a member of some library, otherwise return
@@ -257,29 +895,9 @@ class YAMLFile(object):
 
     def get_object_sizes(self):
         '''Populate objs, lib_objs and generated, and return objs.'''
-        if self.objs:
+        if self.objs or 'sizes' in self.collected:
             return self.objs
-        for osection in self.yamlfile['OutputSections']:
-            sec_type = self.get_section_type(osection)
-            if not sec_type:
-                continue
-            ret = False
-            if osection['Contents'] is None:
-                self.update_object_sizes_no_content(osection, sec_type)
-                continue
-            for isection in osection['Contents']:
-                new_sec_type = self.get_section_type(isection)
-                if (new_sec_type is None):
-                    new_sec_type = sec_type
-                newret = self.update_object_sizes(isection, new_sec_type)
-                if newret is True:
-                    ret = newret
-            # Check if all of the content was able to be parsed. If the content
-            # cannot be parsed, the size of the payload is the size of the
-            # output section.
-            if ret is False:
-                self.update_linker_script_size(osection, sec_type, osection['Size'])
-
+        self.aggregate(['sizes'])
         return self.objs
 
     def is_contents(self, item):
@@ -408,59 +1026,89 @@ class YAMLFile(object):
                         else:
                             print ("\n Execution Region  %s  Base: %08x, Size: %08x\n" % (isection , object_map[0]['addr'], object_map[len (object_map)-1]['totalSize'] ))
                             print("     Base Addr       Size         Type   Attr      E Section Name                        Object")
-                            for k, v in object_map.items():
-                                print("    {0:#010x}   {1:#011x}      {2:6s}  {3:6s}  {4:35s}     {5:11s}".format(
-                                v['addr'], v['size'], v['type'],v['attr'], v['s_name'],
-                                os.path.basename(v['origin'])))
+                            write_rows("    %#010x   %#011x      %-6s  %-6s  %-35s     %-11s",
+                                       ((v['addr'], v['size'], v['type'], v['attr'], v['s_name'],
+                                         os.path.basename(v['origin']))
+                                        for v in object_map.values()))
+
+    def iter_object_map(self):
+        '''Yield (load region, execution region, address, size, type, attr,
+        section, origin) for every input section of the memory map.
+        '''
+        for osection in self.yamlfile['LoadRegions']:
+            if 'Sections' in osection and osection['Sections'] is not None:
+                for isection in osection['Sections']:
+                    object_map = self.get_object_map_code(isection)
+                    if object_map is not None:
+                        for v in object_map.values():
+                            yield (osection['Name'], isection, v['addr'],
+                                   v['size'], v['type'], v['attr'],
+                                   v['s_name'], v['origin'])
 
     def get_object_symbols(self):
         '''symbols detail infomation .'''
         print ("Symbol Name           Value      Ov Type        Size       Object(Section)")
+        write_rows("   %s         %08x        %s      %08x       %s\n",
+                   self.iter_object_symbols())
+
+    def iter_object_symbols(self):
+        '''Yield (symbol, value, type, size, origin) for every symbol.'''
         for osection in self.yamlfile['OutputSections']:
             if 'Contents' in osection and osection['Contents'] is not None:
                 for isection in osection['Contents']:
-                    obj_name = self.get_name(isection)
                     origin = self.get_origin(isection)
                     symbols = self.get_symbols(isection)
                     if symbols is not None:
                         for symbol_detail in isection['Symbols']:
-                            symbol_symbol = self.get_symbols_symbol(symbol_detail)
-                            symbol_value = self.get_symbols_value(symbol_detail)
-                            symbol_type = self.get_symbols_type(symbol_detail)
-                            symbol_size = self.get_symbols_size(symbol_detail)
-                            print ("   %s         %08x        %s      %08x       %s\n" % (symbol_symbol, symbol_value, symbol_type, symbol_size, origin ))
-
-    def get_section_symbols(self, item):
-        '''entry address code .'''
-        i = 0
-        self.object_map_code = {}
+                            yield (self.get_symbols_symbol(symbol_detail),
+                                   self.get_symbols_value(symbol_detail),
+                                   self.get_symbols_type(symbol_detail),
+                                   self.get_symbols_size(symbol_detail),
+                                   origin)
+
+    def get_section_symbols_index(self):
+        '''Return {input section name: [(symbol, size)]} of the symbols with a
+        non-zero size, in map order. Built on first use in one pass over
+        OutputSections.
+        '''
+        if self.section_symbols is not None:
+            return self.section_symbols
+        self.section_symbols = {}
         for osection in self.yamlfile['OutputSections']:
-            section_name = osection.get('Name', "")
             if 'Contents' in osection and osection['Contents'] is not None:
-                base = self.get_address(osection)
                 for isection in osection['Contents']:
+                    symbols = self.get_symbols(isection)
+                    if symbols is None:
+                        continue
                     e_section_name = self.get_name(isection)
-                    if (item == e_section_name):
-                        symbols = self.get_symbols(isection)
-                        if symbols is not None:
-                          for symbol_detail in isection['Symbols']:
-                              symbol_symbol = self.get_symbols_symbol(symbol_detail)
-                              symbol_value = self.get_symbols_value(symbol_detail)
-                              symbol_type = self.get_symbols_type(symbol_detail)
-                              symbol_size = self.get_symbols_size(symbol_detail)
-                              '''print "   %s  %s  %s  %d\n" % (symbol_symbol, symbol_value, symbol_type, symbol_size )'''
-                              if (symbol_size != 0):
-                                self.object_map_code[i] = {
-                                    'function': symbol_symbol,
-                                    'size': symbol_size
-                                }
-                                i += 1
-        if (len(self.object_map_code) == 0):
-          return None
+                    entries = self.section_symbols.get(e_section_name)
+                    if entries is None:
+                        entries = self.section_symbols[e_section_name] = []
+                    for symbol_detail in symbols:
+                        symbol_size = self.get_symbols_size(symbol_detail)
+                        if (symbol_size != 0):
+                            entries.append((
+                                self.get_symbols_symbol(symbol_detail),
+                                symbol_size))
+        return self.section_symbols
+
+    def get_section_symbols(self, item):
+        '''Return {i: {'function', 'size'}} for the sized symbols of every input
+        section named item, None if there are none.
+        '''
+        entries = self.get_section_symbols_index().get(item)
+        if not entries:
+            return None
+        self.object_map_code = {}
+        for i, (symbol_symbol, symbol_size) in enumerate(entries):
+            self.object_map_code[i] = {
+                'function': symbol_symbol,
+                'size': symbol_size
+            }
         return self.object_map_code
 
-    def get_trampolines(self):
-        '''trampolines detail infomation .'''
+    def get_trampolines(self, log=print):
+        '''trampolines detail infomation, printed with log.'''
         self.trampoline_set = {}
         i = 0
         for osection in self.yamlfile['Trampolines']:
@@ -478,33 +1126,33 @@ class YAMLFile(object):
                     if object_map is not None:
                         '''This happens when no -ffunction-sections was used.'''
                         if (len(object_map) > 1):
-                          print ("%s %s %s %s multiple_callers 0 0" % (osection_name , name, caller_section, callee ))
+                          log ("%s %s %s %s multiple_callers 0 0" % (osection_name , name, caller_section, callee ))
                         else:
                           ''' Actually only one symbol in the section. '''
                           for k, v in object_map.items():
                             if 'Uses' in isection and isection['Uses'] is not None:
-                              print ("%s %s %s %s %d %s %d" % (osection_name , name, caller_section, v['function'], v['size'], callee, len(isection['Uses'])))
+                              log ("%s %s %s %s %d %s %d" % (osection_name , name, caller_section, v['function'], v['size'], callee, len(isection['Uses'])))
                             else:
-                              print ("%s %s %s %s %d %s 0" % (osection_name , name, caller_section, v['function'], v['size'], callee ))
+                              log ("%s %s %s %s %d %s 0" % (osection_name , name, caller_section, v['function'], v['size'], callee ))
                             self.trampoline_set[i] = {'osection' : osection_name, 'caller' : v['function'], 'calee': callee }
                             i += 1
                     else:
-                        print ("%s %s %s %s missing_caller_symbols" % (osection_name , name, caller_section, callee ))
+                        log ("%s %s %s %s missing_caller_symbols" % (osection_name , name, caller_section, callee ))
                     '''Now, if we have multiple users of this trampoline, try to resolve that part. '''
                     if 'Uses' in isection and isection['Uses'] is not None:
-                      print ("reuses:")
+                      log ("reuses:")
                       for users in isection['Uses']:
                         user = self.get_from(users)
                         object_map = self.get_section_symbols(user)
                         if object_map is not None:
                           for k, v in object_map.items():
-                            print ("  %s %s %d %s" % ( user, v['function'], v['size'], callee ))
+                            log ("  %s %s %d %s" % ( user, v['function'], v['size'], callee ))
                             self.trampoline_set[i] = {'osection' : osection_name, 'caller' : v['function'], 'calee': callee }
                             i += 1
         return self.trampoline_set
 
-    def get_trampolines_without_sections(self):
-        '''trampolines detail infomation .'''
+    def get_trampolines_without_sections(self, log=print):
+        '''trampolines detail infomation, printed with log.'''
         self.trampoline_set = {}
         i = 0
         for osection in self.yamlfile:
@@ -516,7 +1164,7 @@ class YAMLFile(object):
                     callee_to = self.get_to(isection)
                     callee_section = self.get_tosection(isection)
                     callee_list = []
-                    print ("%s %s %s %s %s" % (osection_name , name, caller_section, callee_to, callee_section))
+                    log ("%s %s %s %s %s" % (osection_name , name, caller_section, callee_to, callee_section))
                     # Gather calees list
                     if 'ToSymbols' in isection and isection['ToSymbols'] is not None:
                       for clesym in isection['ToSymbols']:
@@ -538,15 +1186,15 @@ class YAMLFile(object):
                           continue
                         if 'STT_FUNC' in type:
                           caller_symbol = csym['Symbol']
-                          print ("  from %s" % (caller_symbol))
+                          log ("  from %s" % (caller_symbol))
                           # Now for each caller symbol, iterate through calee list.
                           for callee_symbol in callee_list:
-                            print ("  to   %s" % (callee_symbol))
+                            log ("  to   %s" % (callee_symbol))
                             self.trampoline_set[i] = {'osection' : osection_name, 'caller' : caller_symbol, 'calee': callee_symbol, 'tosection': callee_section, 'name': name }
                             i += 1
                     # Now, if we have multiple users of this trampoline, try to resolve that part.
                     if 'Uses' in isection and isection['Uses'] is not None:
-                      print ("Reuses %d:" % (len(isection['Uses'])))
+                      log ("Reuses %d:" % (len(isection['Uses'])))
                       for users in isection['Uses']:
                         user = self.get_from(users)
                         if 'Symbols' in users and users['Symbols'] is not None:
@@ -558,7 +1206,7 @@ class YAMLFile(object):
                             if 'STT_FUNC' in type:
                               user_caller_symbol = symbol['Symbol']
                               for callee_symbol in callee_list:
-                                print ("  %s %s %s" % ( user, user_caller_symbol, callee_symbol ))
+                                log ("  %s %s %s" % ( user, user_caller_symbol, callee_symbol ))
                                 self.trampoline_set[i] = {'osection' : osection_name, 'caller' : user_caller_symbol, 'calee': callee_symbol, 'tosection': callee_section, 'name': name }
                                 i += 1
         return self.trampoline_set
@@ -616,11 +1264,16 @@ class YAMLFile(object):
 
     def get_reference(self):
         '''section reference code .'''
+        write_rows(" %s refers to %s",
+                   ((refer_file, refer_to)
+                    for refer_to, refer_file in self.iter_references()))
+
+    def iter_references(self):
+        '''Yield (symbol, referenced by) for every cross reference.'''
         for osection in self.yamlfile['CrossReference']:
             if osection is not None:
-                refer_to = osection.get('Symbol', "")
-                refer_file = osection.get('ReferencedBy', "")
-                print (" %s refers to %s" % (refer_file, refer_to))
+                yield (osection.get('Symbol', ""),
+                       osection.get('ReferencedBy', ""))
 
     def get_generated_sizes(self):
         '''Return generated.'''
@@ -693,25 +1346,58 @@ class YAMLFile(object):
 
     def get_unused(self):
         '''Return unsued sections.'''
-        if self.unused:
+        if self.unused or 'unused' in self.collected:
             return self.unused
-        for section in self.yamlfile['DiscardedSections']:
-            self.unused[self.get_name(section)] = {
-                'origin': self.get_origin(section),
-                'size': self.get_size(section)
-                }
+        self.aggregate(['unused'])
         return self.unused
 
     def get_unused_symbols(self):
         '''Return unused symbols.'''
-        if self.unused_symbols:
+        if self.unused_symbols or 'unusedsymbols' in self.collected:
             return self.unused_symbols
-        for section in self.yamlfile['DiscardedSections']:
-            if 'Symbols' in section:
-                for sym in section['Symbols']:
-                    self.unused_symbols.append(sym['Symbol'])
+        self.aggregate(['unusedsymbols'])
         return self.unused_symbols
 
+    def get_output_section_sizes(self):
+        '''Return {output section name: size}.'''
+        if 'budget' not in self.collected:
+            self.aggregate(['budget'])
+        return self.output_section_sizes
+
+    def get_image_symbols(self):
+        '''Return the symbols of all input sections except mapping symbols,
+        each with its Origin and the Region of the last mapping symbol set.
+        '''
+        if self.symbols is not None:
+            return self.symbols
+        self.aggregate(['symbols'])
+        self.symbols = []
+        region = ''
+        aarch64 = (bool(self.symbol_sections) and
+                   self.get_architecture() == 'aarch64')
+        for isec in self.symbol_sections:
+            for sym in isec['Symbols']:
+                name = sym['Symbol']
+                if name.startswith('$d.'):
+                    region = 'Data'
+                    continue
+                if aarch64:
+                    if name.startswith('$x.'):
+                        region = 'AT64 Code'
+                        continue
+                else:
+                    if name.startswith('$t.'):
+                        region = 'Thumb Code'
+                        continue
+                    if name.startswith('$a.'):
+                        region = 'ARM Code'
+                        continue
+                sym['Origin'] = os.path.basename(isec['Origin']) + '(' + isec['Name'] + ')'
+                sym['Region'] = region
+                self.symbols.append(sym)
+        self.symbol_sections = []
+        return self.symbols
+
     def get_unused_objects(self):
         '''Return unused objects.'''
         for section in self.yamlfile['InputInfo']:
@@ -740,9 +1426,21 @@ class YAMLFile(object):
                             file_path = sub_section.get('Path', "")
                             print ("  Unused objects:    %s" % file_path)
 
+    def iter_unused_objects(self):
+        '''Yield (path, member) for every unused input file, member is ''
+        unless the input file is an archive member.
+        '''
+        for section in self.yamlfile['InputInfo']:
+            path = section.get('Path', "")
+            if section.get('Used', "") == 'NotUsed':
+                yield (path, '')
+            for sub_section in section.get('Members') or ():
+                if sub_section.get('Used', "") == 'NotUsed':
+                    yield (path, sub_section.get('Path', ""))
+
     def has_key_word(self, item):
         '''Return True if item is in file, otherwise return False.'''
-        return item in self.yamlfile
+        return item in self.keys
 
 def get_library_name(s):
     '''Return library name.'''
@@ -776,9 +1474,10 @@ def handle_symbols_xx(yamlfile):
     else:
         print ("No information about Symbol Table\n")
 
-def handle_trampolines(yamlfile, tramp_map_file, tramp_stat_file, trampolines_section_filter_file_name):
+def handle_trampolines(yamlfile, tramp_map_file, tramp_stat_file, trampolines_section_filter_file_name, log=print):
     '''Handle --trampolines
-       Final file format is _tramp_entry_ caller_name calee_name for each unique trampoline'''
+       Final file format is _tramp_entry_ caller_name calee_name for each unique trampoline.
+       Details are printed with log, the trampoline map is returned.'''
     to_osection_list = []
     from_osection_list = []
     if (trampolines_section_filter_file_name != ''):
@@ -791,31 +1490,32 @@ def handle_trampolines(yamlfile, tramp_map_file, tramp_stat_file, trampolines_se
               else:
                 to_osection_list.append(value[1])
         fp.close()
-        print("Section to filter  :", to_osection_list)
-        print("Section from filter:", from_osection_list)
+        log("Section to filter  :", to_osection_list)
+        log("Section from filter:", from_osection_list)
 
     keyword1 = 'Trampolines'
     keyword2 = 'OutputSections'
     if (yamlfile.has_key_word(keyword1)):
         if (yamlfile.has_key_word(keyword2)):
           '''This means we likely have full yaml map file '''
-          trampoline_map = yamlfile.get_trampolines()
-          print ("Gather %d entries" % (len(trampoline_map.items())))
+          trampoline_map = yamlfile.get_trampolines(log)
+          log ("Gather %d entries" % (len(trampoline_map.items())))
           for k, v in trampoline_map.items():
             if to_osection_list.count(str(v['osection'])):
               tramp_map_file.write("_tramp_entry_ %s %s\n" % (v['caller'], v['calee'] ))
         else:
-          print ("No information about trampolines in map\n")
+          log ("No information about trampolines in map\n")
+          return {}
     else:
       '''This means we likely do not have full yaml map file '''
-      trampoline_map = yamlfile.get_trampolines_without_sections()
-      print ("Gather %d entries" % (len(trampoline_map.items())))
+      trampoline_map = yamlfile.get_trampolines_without_sections(log)
+      log ("Gather %d entries" % (len(trampoline_map.items())))
       specified_cnt = 0
       for k, v in trampoline_map.items():
         if to_osection_list.count(str(v['osection'])) or from_osection_list.count(str(v['tosection'])):
           tramp_map_file.write("_tramp_entry_ %s %s\n" % (v['caller'], v['calee']))
           specified_cnt += 1
-      print ("For specified sections used %d entries" % (specified_cnt))
+      log ("For specified sections used %d entries" % (specified_cnt))
       # Create stat and transition map
       unique_tramps, reuse_tramps = yamlfile.get_trampolines_stats()
       for k in sorted(unique_tramps):
@@ -827,6 +1527,7 @@ def handle_trampolines(yamlfile, tramp_map_file, tramp_stat_file, trampolines_se
       for k, v in trampoline_map.items():
         tramp_stat_file.write("%s %s %s %s %s\n" % (v['osection'], v['tosection'], v['name'], v['caller'], v['calee']))
       tramp_stat_file.close()
+    return trampoline_map
 
 def handle_xref(yamlfile):
     '''Handle --xref'''
@@ -838,6 +1539,15 @@ def handle_xref(yamlfile):
     yamlfile.get_reference()
 
 
+SIZES_ROW = "%9d%11d%11d%11d%11d%11d   %s"
+
+
+def get_sizes_row(v, name):
+    '''Return the SIZES_ROW fields of the sizes v of name.'''
+    return (v['code']+v['data'], v['data'], v['ro_data'], v['rw_data'],
+            v['zi_data'], v['debug'], name)
+
+
 def handle_sizes(yamlfile):
     '''Handle topic 'sizes' of --info.'''
     keyword = 'OutputSections'
@@ -847,10 +1557,8 @@ def handle_sizes(yamlfile):
     print("Image component sizes")
     objs = yamlfile.get_object_sizes()
     print("     Code (inc. data)   RO Data    RW Data    ZI Data      Debug   Object Name")
-    for k, v in sorted(objs.items()):
-        print("{0:9d}{1:11d}{2:11d}{3:11d}{4:11d}{5:11d}   {6}".format(
-                v['code']+v['data'], v['data'], v['ro_data'], v['rw_data'],
-                v['zi_data'], v['debug'], os.path.basename(k)))
+    write_rows(SIZES_ROW, (get_sizes_row(v, os.path.basename(k))
+                           for k, v in sorted(objs.items())))
     obj_totals = yamlfile.get_object_totals()
     print("   ----------------------------------------------------------------------")
     print("{0:9d}{1:11d}{2:11d}{3:11d}{4:11d}{5:11d}   Object Totals".format(
@@ -865,10 +1573,8 @@ def handle_sizes(yamlfile):
     lib_objs = yamlfile.get_library_member_sizes()
     print("   ----------------------------------------------------------------------")
     print("     Code (inc. data)   RO Data    RW Data    ZI Data      Debug   Library Member Name")
-    for k, v in lib_objs.items():
-        print("{0:9d}{1:11d}{2:11d}{3:11d}{4:11d}{5:11d}   {6}".format(
-                v['code']+v['data'], v['data'], v['ro_data'], v['rw_data'],
-                v['zi_data'], v['debug'], get_library_member_name(k)))
+    write_rows(SIZES_ROW, (get_sizes_row(v, get_library_member_name(k))
+                           for k, v in lib_objs.items()))
     lib_totals = yamlfile.get_library_totals()
     print("   ----------------------------------------------------------------------")
     print("{0:9d}{1:11d}{2:11d}{3:11d}{4:11d}{5:11d}   Library Totals".format(
@@ -878,10 +1584,8 @@ def handle_sizes(yamlfile):
     libs = yamlfile.get_library_sizes()
     print("   ----------------------------------------------------------------------")
     print("     Code (inc. data)   RO Data    RW Data    ZI Data      Debug   Library Name")
-    for k, v in libs.items():
-        print("{0:9d}{1:11d}{2:11d}{3:11d}{4:11d}{5:11d}   {6}".format(
-                v['code']+v['data'], v['data'], v['ro_data'], v['rw_data'],
-                v['zi_data'], v['debug'], os.path.basename(k)))
+    write_rows(SIZES_ROW, (get_sizes_row(v, os.path.basename(k))
+                           for k, v in libs.items()))
     print("   ----------------------------------------------------------------------")
     print("{0:9d}{1:11d}{2:11d}{3:11d}{4:11d}{5:11d}   Library Totals".format(
             lib_totals['code']+lib_totals['data'], lib_totals['data'],
@@ -969,6 +1673,240 @@ def handle_totals(yamlfile):
     print("=============================================================================")
 
 
+def load_map_sizes(args):
+    '''Return get_map_sizes of the map at path, in a worker process.'''
+    path, cache_dir, cache_size = args
+    cache = None
+    if cache_dir:
+        cache = YAMLMapCache(cache_dir, cache_size)
+    with open(path, 'r') as f:
+        yamlfile = YAMLFile(f, set(['Header']), set(['sizes']), cache)
+    return get_map_sizes(yamlfile)
+
+
+def get_map_sizes(yamlfile):
+    '''Return the sizes that --diff compares, {kind: {name: sizes}} for the
+    kinds object, library and total.
+    '''
+    return {
+        'object': yamlfile.get_object_sizes(),
+        'library': yamlfile.get_library_sizes(),
+        'total': {
+            'Object Totals': yamlfile.get_object_totals(),
+            '(incl. Generated)': yamlfile.get_generated_sizes(),
+            'Library Totals': yamlfile.get_library_totals(),
+            'Grand Totals': yamlfile.get_grand_totals(),
+        },
+    }
+
+
+DIFF_TOTALS = ('Object Totals', '(incl. Generated)', 'Library Totals',
+               'Grand Totals')
+
+
+def get_size_deltas(old, new):
+    '''Return [(name, status, deltas)] for the names of the sizes dicts old
+    and new that were added, removed or changed in size. status is added,
+    removed or changed, deltas are new minus old in SIZE_FIELDS order. The
+    largest change of the image size comes first.
+    '''
+    zero = dict.fromkeys(SIZE_FIELDS, 0)
+    deltas = []
+    for name in set(old) | set(new):
+        old_sizes = old.get(name)
+        new_sizes = new.get(name)
+        if old_sizes is None:
+            status = 'added'
+        elif new_sizes is None:
+            status = 'removed'
+        else:
+            status = 'changed'
+        old_sizes = old_sizes or zero
+        new_sizes = new_sizes or zero
+        delta = tuple([new_sizes[t] - old_sizes[t] for t in SIZE_FIELDS])
+        if status != 'changed' or any(delta):
+            deltas.append((name, status, delta))
+    # Debug sizes are not part of the image.
+    deltas.sort(key=lambda d: (-abs(sum(d[2][:5])), d[0]))
+    return deltas
+
+
+def get_total_deltas(old, new):
+    '''Return [(name, 'changed', deltas)] for every name of DIFF_TOTALS.'''
+    return [(name, 'changed', tuple([new[name][t] - old[name][t]
+                                     for t in SIZE_FIELDS]))
+            for name in DIFF_TOTALS]
+
+
+DIFF_ROW = "%+9d%+11d%+11d%+11d%+11d%+11d   %s"
+
+
+def get_diff_row(delta, name):
+    '''Return the DIFF_ROW fields of delta, a get_size_deltas item.'''
+    d = delta[2]
+    if delta[1] != 'changed':
+        name += ' (' + delta[1] + ')'
+    return (d[0]+d[1], d[1], d[2], d[3], d[4], d[5], name)
+
+
+def handle_diff(yamlfile, old_sizes, old_name):
+    '''Handle --diff, old_sizes are the get_map_sizes of the map old_name.'''
+    keyword = 'OutputSections'
+    if not yamlfile.has_key_word(keyword):
+        print ("No information about size\n")
+        return
+    new_sizes = get_map_sizes(yamlfile)
+    print("Image component size changes from " + old_name)
+    for kind, title, plural in (('object', 'Object Name', 'objects'),
+                                ('library', 'Library Name', 'libraries')):
+        deltas = get_size_deltas(old_sizes[kind], new_sizes[kind])
+        print("     Code (inc. data)   RO Data    RW Data    ZI Data      Debug   " + title)
+        write_rows(DIFF_ROW, (get_diff_row(d, os.path.basename(d[0]))
+                              for d in deltas))
+        print("   ----------------------------------------------------------------------")
+        print("{0:d} {1:s} added, {2:d} removed, {3:d} changed".format(
+                sum(1 for d in deltas if d[1] == 'added'), plural,
+                sum(1 for d in deltas if d[1] == 'removed'),
+                sum(1 for d in deltas if d[1] == 'changed')))
+        print("   ----------------------------------------------------------------------")
+    print("=============================================================================")
+    print("     Code (inc. data)   RO Data    RW Data    ZI Data      Debug")
+    write_rows(DIFF_ROW, (get_diff_row(d, d[0]) for d in get_total_deltas(
+        old_sizes['total'], new_sizes['total'])))
+    print("=============================================================================")
+
+
+def iter_diff_records(yamlfile, old_sizes):
+    '''Yield the records of --diff, objects, libraries and then totals.'''
+    new_sizes = get_map_sizes(yamlfile)
+    for kind in ('object', 'library'):
+        for name, status, delta in get_size_deltas(old_sizes[kind],
+                                                   new_sizes[kind]):
+            yield (kind, name, status) + delta
+    for name, status, delta in get_total_deltas(old_sizes['total'],
+                                                new_sizes['total']):
+        yield ('total', name, status) + delta
+
+
+BUDGET_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def read_budget_limits(path):
+    '''Return {load region or output section name: max bytes} of the limits
+    file at path. Each line is a name and a size, a decimal or 0x prefixed
+    hexadecimal number with an optional K, M or G suffix; # starts a
+    comment. Raises ValueError for malformed lines.
+    '''
+    limits = {}
+    with open(path, 'r') as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) != 2:
+                raise ValueError('{0}:{1:d}: expected NAME MAX_BYTES'.format(
+                    path, lineno))
+            name, size = fields
+            scale = BUDGET_UNITS.get(size[-1:].upper(), 1)
+            if scale != 1:
+                size = size[:-1]
+            base = 10
+            if size[:2].lower() == '0x':
+                base = 16
+            try:
+                limits[name] = int(size, base) * scale
+            except ValueError:
+                raise ValueError('{0}:{1:d}: invalid size {2}'.format(
+                    path, lineno, fields[1]))
+    return limits
+
+
+def get_budget_status(used, limit, near):
+    '''Return OVERFLOW, NEAR if used is at least near percent of limit, OK,
+    or '' without a limit.
+    '''
+    if limit is None:
+        return ''
+    if used > limit:
+        return 'OVERFLOW'
+    if limit and used * 100 >= limit * near:
+        return 'NEAR'
+    return 'OK'
+
+
+def get_budget(yamlfile, limits, near):
+    '''Return the budget rows (kind, name, region, used, limit, status) of
+    yamlfile: each load region, used is its MemorySize, followed by its
+    output sections, then the output sections with a limit that are in no
+    load region and the names of limits that are not in the map, with
+    status MISSING.
+    '''
+    sizes = yamlfile.get_output_section_sizes()
+    seen = set()
+    rows = []
+    def check(kind, name, region, used):
+        seen.add(name)
+        limit = limits.get(name)
+        rows.append((kind, name, region, used, limit,
+                     get_budget_status(used, limit, near)))
+    for region in yamlfile.yamlfile['LoadRegions']:
+        check('region', region['Name'], '', region['MemorySize'])
+        for name in region.get('Sections') or ():
+            check('output_section', name, region['Name'], sizes.get(name, 0))
+    for name in sorted(sizes):
+        if name in limits and name not in seen:
+            check('output_section', name, '', sizes[name])
+    for name in sorted(limits):
+        if name not in seen:
+            rows.append(('', name, '', None, limits[name], 'MISSING'))
+    return rows
+
+
+def get_budget_exit_status(rows):
+    '''Return 3 if a budget row overflows, 1 if one is near its limit, else
+    0. Status 2 is left to input errors, as argparse uses it.
+    '''
+    statuses = set(row[5] for row in rows)
+    if 'OVERFLOW' in statuses:
+        return 3
+    if 'NEAR' in statuses:
+        return 1
+    return 0
+
+
+BUDGET_ROW = "    %-36s%12s%12s %8s  %s"
+
+
+def get_budget_text_row(row):
+    '''Return the text fields of the budget row.'''
+    kind, name, region, used, limit, status = row
+    if kind == 'output_section':
+        name = '  ' + name
+    use = '-'
+    if used is not None and limit:
+        use = '{0:.1f}'.format(used * 100.0 / limit)
+    return (name, '-' if used is None else used,
+            '-' if limit is None else limit, use, status or '-')
+
+
+def handle_budget(yamlfile, limits, near, limits_name):
+    '''Handle --budget, return the exit status.'''
+    keyword = 'LoadRegions'
+    if not yamlfile.has_key_word(keyword):
+        print ("No information about load regions\n")
+        return 2
+    rows = get_budget(yamlfile, limits, near)
+    print("Memory budget from " + limits_name)
+    print(BUDGET_ROW % ('Name', 'Used', 'Limit', 'Use%', 'Status'))
+    write_rows(BUDGET_ROW, (get_budget_text_row(row) for row in rows))
+    print("=============================================================================")
+    print("{0:d} overflow(s), {1:d} near the limit ({2:g}%), {3:d} missing"
+          .format(sum(1 for row in rows if row[5] == 'OVERFLOW'),
+                  sum(1 for row in rows if row[5] == 'NEAR'), near,
+                  sum(1 for row in rows if row[5] == 'MISSING')))
+    return get_budget_exit_status(rows)
+
+
 def handle_architecture(yamlfile):
     '''Handle topic 'architecture' of --info.'''
     print("Architecture: " + yamlfile.get_architecture())
@@ -990,34 +1928,7 @@ def get_symbol_type(sym, yamlfile):
     return sym['Region']
 
 def get_symbols(yamlfile):
-    symbols = []
-    region = ''
-    for osec in yamlfile.yamlfile['OutputSections']:
-        if 'Contents' not in osec or not osec['Contents']:
-            continue
-        for isec in osec['Contents']:
-            if 'Symbols' not in isec:
-                continue
-            for sym in isec['Symbols']:
-                name = sym['Symbol']
-                if name.startswith('$d.'):
-                    region = 'Data'
-                    continue
-                if yamlfile.get_architecture() == 'aarch64':
-                    if name.startswith('$x.'):
-                        region = 'AT64 Code'
-                        continue
-                else:
-                    if name.startswith('$t.'):
-                        region = 'Thumb Code'
-                        continue
-                    if name.startswith('$a.'):
-                        region = 'ARM Code'
-                        continue
-                sym['Origin'] = os.path.basename(isec['Origin']) + '(' + isec['Name'] + ')'
-                sym['Region'] = region
-                symbols.append(sym)
-    return symbols
+    return yamlfile.get_image_symbols()
 
 def handle_symbols(yamlfile):
     '''Handle Local and Global symbols'''
@@ -1027,23 +1938,22 @@ def handle_symbols(yamlfile):
         addr_field = '16'
     title_fmt = '    {:<40s} {:<' + addr_field + 's}   {:<10s} {:5s} {:s}'
     title = title_fmt.format('Symbol Name', 'Value', 'Ov Type', 'Size', 'Object(Section)')
-    fmt = '    {:40s} {:#0' + addr_field + 'x}   {:10s}{:#5d}   {:s}'
+    fmt = '    %-40s %#0' + addr_field + 'x   %-10s%5d   %s'
 
     print ('==============================================================================')
     print ('Image Symbol Table')
     print ('    Local Symbols')
     print (title)
     symbols = get_symbols(yamlfile)
-    for sym in symbols:
-        sym_type = get_symbol_type(sym, yamlfile)
-        if sym['Scope'] and sym_type != 'Section' : # local
-            print(fmt.format(sym['Symbol'], sym['Value'], sym_type, sym['Size'], sym['Origin']))
+    sym_types = [get_symbol_type(sym, yamlfile) for sym in symbols]
+    write_rows(fmt, ((sym['Symbol'], sym['Value'], sym_type, sym['Size'], sym['Origin'])
+                     for sym, sym_type in zip(symbols, sym_types)
+                     if sym['Scope'] and sym_type != 'Section')) # local
     print ('    Global Symbols')
     print (title)
-    for sym in symbols:
-        sym_type = get_symbol_type(sym, yamlfile)
-        if sym['Scope'] == 0 and sym_type != 'Section': #global
-            print(fmt.format(sym['Symbol'], sym['Value'], sym_type, sym['Size'], sym['Origin']))
+    write_rows(fmt, ((sym['Symbol'], sym['Value'], sym_type, sym['Size'], sym['Origin'])
+                     for sym, sym_type in zip(symbols, sym_types)
+                     if sym['Scope'] == 0 and sym_type != 'Section')) #global
     print ('==============================================================================')
 
 def handle_unused(yamlfile):
@@ -1109,6 +2019,127 @@ def handle_info(yaml_file, info):
             print('Unsupported topic: ' + topic)
 
 
+def get_size_record(kind, name, v):
+    '''Return the sizes record of kind of the sizes v of name.'''
+    return (kind, name) + tuple([v[t] for t in SIZE_FIELDS])
+
+
+def iter_totals_records(yamlfile):
+    '''Yield the records of topic 'totals'.'''
+    yield get_size_record('object_totals', '', yamlfile.get_object_totals())
+    yield get_size_record('generated', '', yamlfile.get_generated_sizes())
+    yield get_size_record('library_totals', '', yamlfile.get_library_totals())
+    yield get_size_record('grand_totals', '', yamlfile.get_grand_totals())
+
+
+def iter_sizes_records(yamlfile):
+    '''Yield the records of topic 'sizes', totals after the sizes.'''
+    for k, v in sorted(yamlfile.get_object_sizes().items()):
+        yield get_size_record('object', k, v)
+    for k, v in yamlfile.get_library_member_sizes().items():
+        yield get_size_record('library_member', k, v)
+    for k, v in yamlfile.get_library_sizes().items():
+        yield get_size_record('library', k, v)
+    for record in iter_totals_records(yamlfile):
+        yield record
+
+
+def iter_summarysizes_records(yamlfile):
+    '''Yield the record of topic 'summarysizes'.'''
+    yield get_size_record('grand_totals', '', yamlfile.get_grand_totals())
+
+
+def iter_architecture_records(yamlfile):
+    '''Yield the record of topic 'architecture'.'''
+    yield (yamlfile.get_architecture(), yamlfile.get_emulation(),
+           yamlfile.get_address_size())
+
+
+def iter_unused_records(yamlfile):
+    '''Yield the records of topic 'unused'.'''
+    for k, v in yamlfile.get_unused().items():
+        yield (k, v['origin'], v['size'])
+
+
+def iter_unusedsymbols_records(yamlfile):
+    '''Yield the records of topic 'unusedsymbols'.'''
+    for sym in yamlfile.get_unused_symbols():
+        yield (sym,)
+
+
+def iter_symbols_records(yamlfile):
+    '''Yield the records of --symbols, local symbols first.'''
+    symbols = get_symbols(yamlfile)
+    sym_types = [get_symbol_type(sym, yamlfile) for sym in symbols]
+    # The same tests of Scope as the text output of handle_symbols.
+    for scope, in_scope in (('local', lambda sym: sym['Scope']),
+                            ('global', lambda sym: sym['Scope'] == 0)):
+        for sym, sym_type in zip(symbols, sym_types):
+            if in_scope(sym) and sym_type != 'Section':
+                yield (scope, sym['Symbol'], sym['Value'], sym_type,
+                       sym['Size'], sym['Origin'])
+
+
+# The top-level keys each topic of --format needs and its records.
+RECORD_TOPICS = {
+    'architecture': ((), iter_architecture_records),
+    'sizes': (('OutputSections',), iter_sizes_records),
+    'summarysizes': (('OutputSections',), iter_summarysizes_records),
+    'totals': (('OutputSections',), iter_totals_records),
+    'unused': (('DiscardedSections',), iter_unused_records),
+    'unusedsymbols': (('DiscardedSections',), iter_unusedsymbols_records),
+    'unusedobjects': (('InputInfo',), YAMLFile.iter_unused_objects),
+    'symbols': ((), iter_symbols_records),
+    'map': (('LoadRegions', 'OutputSections', 'EntryAddress'),
+            YAMLFile.iter_object_map),
+    'xref': (('CrossReference',), YAMLFile.iter_references),
+}
+
+
+def get_aggregate_topics(args):
+    '''Return the topics of YAMLFile.aggregate the command line needs.'''
+    info = args.info.split(',') if args.info else []
+    topics = set()
+    if set(info) & set(['sizes', 'summarysizes', 'totals']):
+        topics.add('sizes')
+    for topic in ('unused', 'unusedsymbols'):
+        if topic in info:
+            topics.add(topic)
+    if args.symbols:
+        topics.add('symbols')
+    if args.diff:
+        topics.add('sizes')
+    if args.budget:
+        topics.add('budget')
+    return topics
+
+
+def get_load_plan(args):
+    '''Return (keep, streamed) for YAMLFile: the top-level keys that the
+    requested output needs in full and the aggregate topics that are
+    collected while the map is parsed.
+    '''
+    topics = args.info.split(',') if args.info else []
+    keep = set(['Header'])
+    if args.map:
+        keep.update(['EntryAddress', 'LoadRegions', 'OutputSections'])
+    if args.xref:
+        keep.add('CrossReference')
+    if args.trampolines:
+        keep.update(['OutputSections', 'Trampolines'])
+    if 'unusedobjects' in topics:
+        keep.add('InputInfo')
+    if args.budget:
+        keep.add('LoadRegions')
+    streamed = set()
+    for topic in get_aggregate_topics(args):
+        if (topic in ('sizes', 'symbols', 'budget') and
+                'OutputSections' in keep):
+            continue
+        streamed.add(topic)
+    return keep, streamed
+
+
 def main():
     parser = argparse.ArgumentParser(description='YAML parser', usage=
                                      '%(prog)s [-h] [--info=topic[,topic,...]] [--map] [--symbols] [--list=file] [--xref] YAML_file',
@@ -1127,7 +2158,8 @@ def main():
                         action='store_true')
     parser.add_argument('--symbols', help='Display symbols in image.',
                         action='store_true')
-    parser.add_argument('--list', help='Redirect output to a file.')
+    parser.add_argument('--list', help='Redirect output to a file, compressed if it ends in .gz\n'
+                        'or .xz.')
     parser.add_argument('--xref', help=
                         'List all cross-references between input sections.',
                         action='store_true')
@@ -1141,37 +2173,175 @@ def main():
         This map can be used for trampoline suppression during compilation.'''
     parser.add_argument('--trampolines', help=
                         'List detail information for each trampoline and create tramp map in provided file')
+    parser.add_argument('--cache-dir', help=
+                        'Keep parsed maps in this directory and reuse them while the map\n'
+                        'file does not change. Only users trusted to run this script\n'
+                        'may have write access to it.')
+    parser.add_argument('--cache-size', type=int, default=2048, help=
+                        'Size limit of --cache-dir in MB, the least recently used maps\n'
+                        'are removed first (default: %(default)s).')
+    parser.add_argument('--diff', metavar='OLD_YAML_file', help=
+                        'List the size changes of objects and libraries from the map\n'
+                        'OLD_YAML_file, which is parsed in a worker process meanwhile.')
+    parser.add_argument('--budget', metavar='LIMITS_file', help=
+                        'Check the memory use of load regions and output sections against\n'
+                        'the limits in LIMITS_file, lines of NAME MAX_BYTES. Exits 3 if\n'
+                        'one overflows, 1 if one is near its limit and 2 on input errors.')
+    parser.add_argument('--budget-near', metavar='PERCENT', type=float,
+                        default=90, help=
+                        'Use of a limit that --budget reports as near (default: %(default)s).')
+    parser.add_argument('--format', choices=('text',) + RecordWriter.FORMATS,
+                        default='text', help=
+                        'Write records instead of text, for --info, --symbols, --map,\n'
+                        '--xref and --trampolines (default: %(default)s).')
+    parser.add_argument('--classifier-stats', action='store_true', help=
+                        'Print the lookups of the section classifier to stderr.')
+    parser.add_argument('--jobs', type=int, default=1, help=
+                        'Split the output sections among this many worker processes for\n'
+                        'sizes and symbols (default: %(default)s).')
     args = parser.parse_args()
-    with open(args.yaml_file, 'r') as f:
-        yamlfile = YAMLFile(f)
+    limits = None
+    if args.budget:
+        try:
+            limits = read_budget_limits(args.budget)
+        except (IOError, ValueError) as e:
+            parser.error(str(e))
+    keep, streamed = get_load_plan(args)
+    cache = None
+    if args.cache_dir:
+        cache = YAMLMapCache(args.cache_dir, args.cache_size << 20)
+    old_sizes = None
+    if args.diff:
+        # The old map is parsed in a worker while this process parses the
+        # new one.
+        pool = multiprocessing.Pool(1)
+        try:
+            old_sizes = pool.apply_async(load_map_sizes, [
+                (args.diff, args.cache_dir, args.cache_size << 20)])
+            with open(args.yaml_file, 'r') as f:
+                yamlfile = YAMLFile(f, keep, streamed, cache, args.jobs)
+            old_sizes = old_sizes.get()
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        with open(args.yaml_file, 'r') as f:
+            yamlfile = YAMLFile(f, keep, streamed, cache, args.jobs)
+    # Everything the requested topics need is collected in one traversal.
+    yamlfile.aggregate(get_aggregate_topics(args))
 
+    # All report output goes through a ReportWriter, also that of print.
+    stdout = sys.stdout
     if args.list:
-        output_file = open(args.list, 'w')
-        sys.stdout = output_file
-
+        sys.stdout = ReportWriter.open(args.list)
+    else:
+        sys.stdout = ReportWriter(stdout)
+    try:
+        if args.format == 'text':
+            status = write_report(args, yamlfile, old_sizes, limits)
+        else:
+            writer = RecordWriter(sys.stdout, args.format)
+            status = write_records(args, yamlfile, writer, old_sizes, limits)
+            writer.close()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    if args.classifier_stats:
+        sys.stderr.write('Section classifier: {hits:d} hits, {misses:d} misses, '
+                         '{classes:d} classes\n'.format(
+                             **yamlfile.classifier.get_stats()))
+    if status:
+        sys.exit(status)
+
+
+def write_report(args, yamlfile, old_sizes=None, limits=None):
+    '''Write the reports selected by args for yamlfile, old_sizes are the
+    get_map_sizes of the map of --diff and limits those of --budget. Return
+    the exit status.
+    '''
+    status = 0
     if args.symbols:
         handle_symbols(yamlfile)
 
     if args.info:
         handle_info(yamlfile, args.info)
 
+    if args.diff:
+        handle_diff(yamlfile, old_sizes, args.diff)
+
+    if args.budget:
+        status = handle_budget(yamlfile, limits, args.budget_near, args.budget)
+
     if args.map:
         handle_map(yamlfile)
 
     if args.xref:
         handle_xref(yamlfile)
 
+    if args.trampolines:
+      write_trampolines(args, yamlfile)
+    return status
+
+
+def write_trampolines(args, yamlfile, log=print):
+    '''Write the files of --trampolines, return the trampoline map.'''
     trampolines_section_filter_file_name = ''
     if args.trampolines_section_filter_file:
       trampolines_section_filter_file_name = args.trampolines_section_filter_file
 
+    tramp_map_file = open(args.trampolines, 'w')
+    tramp_stat_file = open(args.trampolines + '_stat', 'w')
+    trampoline_map = handle_trampolines(yamlfile, tramp_map_file, tramp_stat_file, trampolines_section_filter_file_name, log)
+    tramp_map_file.close()
+    return trampoline_map
+
+
+def write_records(args, yamlfile, writer, old_sizes=None, limits=None):
+    '''Write the records of the reports selected by args for yamlfile with
+    the RecordWriter writer. Notes go to stderr. Return the exit status.
+    '''
+    status = 0
+    topics = []
+    if args.symbols:
+        topics.append('symbols')
+    if args.info:
+        topics.extend(args.info.split(','))
+    if args.map:
+        topics.append('map')
+    if args.xref:
+        topics.append('xref')
+    for topic in topics:
+        if topic not in RECORD_TOPICS:
+            sys.stderr.write('Unsupported topic: ' + topic + '\n')
+            continue
+        keywords, iter_records = RECORD_TOPICS[topic]
+        if not all(yamlfile.has_key_word(k) for k in keywords):
+            sys.stderr.write('No information about ' + topic + '\n')
+            continue
+        writer.write_records(topic, iter_records(yamlfile))
+
+    if args.diff:
+        if yamlfile.has_key_word('OutputSections'):
+            writer.write_records('diff', iter_diff_records(yamlfile, old_sizes))
+        else:
+            sys.stderr.write('No information about diff\n')
+
+    if args.budget:
+        if yamlfile.has_key_word('LoadRegions'):
+            rows = get_budget(yamlfile, limits, args.budget_near)
+            writer.write_records('budget', rows)
+            status = get_budget_exit_status(rows)
+        else:
+            sys.stderr.write('No information about load regions\n')
+            status = 2
+
     if args.trampolines:
-      tramp_map_file = open(args.trampolines, 'w')
-      tramp_stat_file = open(args.trampolines + '_stat', 'w')
-      handle_trampolines(yamlfile, tramp_map_file, tramp_stat_file, trampolines_section_filter_file_name)
-      tramp_map_file.close()
-    if args.list:
-        output_file.close()
+        trampoline_map = write_trampolines(args, yamlfile,
+                                           lambda *args: None)
+        writer.write_records('trampolines', (
+            (v['osection'], v.get('tosection', ''), v.get('name', ''),
+             v['caller'], v['calee']) for v in trampoline_map.values()))
+    return status
 
 if __name__ == '__main__':
     main()